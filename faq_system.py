@@ -1,22 +1,43 @@
 import csv
+import datetime
 import difflib
+import json
+import re
+import uuid
+from collections import OrderedDict
 from typing import List, Dict, Tuple
 import os
+import time
+
+import requests
 from dotenv import load_dotenv
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+# Claude応答からJSON部分を抜き出す正規表現（生成ループ内で毎回使うため事前コンパイル）
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+_JSON_STRING_RE = re.compile(r'("(?:[^"\\]|\\.)*?")')
+
+# Claude APIキーは起動時に一度だけ読む（呼び出しごとにenvironを引かない）
+CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
+
+# セマンティック類似度計算用の埋め込みLRUキャッシュの上限
+SEMANTIC_EMBED_CACHE_SIZE = int(os.getenv('SEMANTIC_EMBED_CACHE_SIZE', '10000'))
+
 
 class FAQSystem:
     def __init__(self, csv_file: str):
         self.faq_data = []
         self.pending_qa = []
+        self.pending_qa_by_id = {}  # id -> 承認待ちQ&A のO(1)ルックアップ用
         self.csv_file = csv_file
         self.pending_file = 'pending_qa.csv'
         self.claude_api_key = None  # web_app.pyから設定される
         self.generation_interrupted = False  # 生成中断フラグ
         self.progress_callback = None  # 進捗報告用コールバック
+        self.faq_accepted_callback = None  # FAQ受理時コールバック（逐次表示用）
         self.duplicate_faqs = []  # 重複判定されたFAQのリスト（デバッグ用）
         self.last_error_message = None  # 最後のエラーメッセージ（タイムアウト用）
 
@@ -34,6 +55,17 @@ class FAQSystem:
         # 承認済みFAQの埋め込みベクトルキャッシュ（FAQ生成の質向上用）
         self.faq_embeddings = None
         self.faq_embeddings_texts = []  # 各埋め込みに対応するFAQ本文
+        self.faq_centroids = None  # クラスタセントロイド（類似FAQ検索の事前絞り込み用）
+        self.faq_cluster_members = {}  # クラスタID -> 行インデックスのリスト
+        self.faq_embeddings_q = None  # int8量子化済みFAQ行列（類似度スキャン用）
+        self.faq_embedding_scales = None  # 量子化ベクトル毎の復元スケール
+
+        # テキスト内容 -> L2正規化済み埋め込み のLRUキャッシュ
+        # （生成時の重複チェックは同じ既存質問と何度も比較するため）
+        self._embedding_cache = OrderedDict()
+
+        # (絶対パス, mtime, サイズ) -> 抽出済みテキスト のキャッシュ
+        self._pdf_text_cache = {}
 
         self.load_faq_data(csv_file)
         self.load_pending_qa()
@@ -83,6 +115,7 @@ class FAQSystem:
             self.save_pending_qa()
         except Exception as e:
             print(f"承認待ちQ&A読み込みエラー: {e}")
+        self.pending_qa_by_id = {item['id']: item for item in self.pending_qa if item.get('id')}
 
     def save_pending_qa(self) -> None:
         """承認待ちQ&Aをファイルに保存"""
@@ -100,92 +133,139 @@ class FAQSystem:
         except Exception as e:
             print(f"承認待ちQ&A保存エラー: {e}")
 
-    def add_pending_qa(self, question: str, answer: str, keywords: str = '', category: str = '一般', user_question: str = '', window_info: str = '') -> str:
+    def add_pending_qa(self, question: str, answer: str, keywords: str = '', category: str = '一般', user_question: str = '', window_info: str = '', timestamp: str = None) -> str:
         """承認待ちQ&Aを追加"""
-        import datetime
-        import uuid
-
-        qa_id = str(uuid.uuid4())[:8]
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        self.pending_qa.append({
-            'id': qa_id,
+        qa_ids = self.add_pending_qa_bulk([{
             'question': question,
             'answer': answer,
             'keywords': keywords,
             'category': category,
-            'created_at': timestamp,
             'user_question': user_question,
-            'confirmation_request': '0',
             'window_info': window_info
-        })
+        }], timestamp=timestamp)
+        return qa_ids[0]
+
+    def add_pending_qa_bulk(self, faqs: list, timestamp: str = None, source: str = '', default_category: str = '一般') -> list:
+        """承認待ちQ&Aをまとめて追加（ファイル書き込みは1回だけ）
 
+        生成結果のdictをそのまま渡せる。sourceとdefault_categoryは
+        各FAQに値がない場合のフォールバックとして使う。
+        """
+        if not timestamp:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        qa_ids = []
+        uuid4 = uuid.uuid4
+        for faq in faqs:
+            get = faq.get
+            qa_id = str(uuid4())[:8]
+            self.pending_qa.append({
+                'id': qa_id,
+                'question': get('question', ''),
+                'answer': get('answer', ''),
+                'keywords': get('keywords', ''),
+                'category': get('category') or default_category,
+                'created_at': timestamp,
+                'user_question': get('user_question') or source,
+                'confirmation_request': '0',
+                'window_info': get('window_info', '')
+            })
+            self.pending_qa_by_id[qa_id] = self.pending_qa[-1]
+            qa_ids.append(qa_id)
+
+        if qa_ids:
+            self.save_pending_qa()
+        return qa_ids
+
+    def approve_pending_qa(self, qa_id: str):
+        """承認待ちQ&Aを承認してFAQに追加
+
+        承認した元レコードを返す（見つからなければNone）。
+        FAQ側は全件リライトせず1行だけ追記する。
+        """
+        pending = self.pending_qa_by_id.get(qa_id)
+        if pending is None:
+            return None
+
+        # FAQに追加
+        self.add_faq(
+            question=pending['question'],
+            answer=pending['answer'],
+            keywords=pending['keywords'],
+            category=pending['category']
+        )
+
+        # 承認待ちから削除
+        self.pending_qa.remove(pending)
+        del self.pending_qa_by_id[qa_id]
         self.save_pending_qa()
-        return qa_id
-
-    def approve_pending_qa(self, qa_id: str) -> bool:
-        """承認待ちQ&Aを承認してFAQに追加"""
-        for i, pending in enumerate(self.pending_qa):
-            if pending['id'] == qa_id:
-                # FAQに追加
-                self.add_faq(
-                    question=pending['question'],
-                    answer=pending['answer'],
-                    keywords=pending['keywords'],
-                    category=pending['category']
-                )
+        self.append_faq_to_csv(self.faq_data[-1])
 
-                # 承認待ちから削除
-                del self.pending_qa[i]
-                self.save_pending_qa()
-                self.save_faq_data()
+        print(f"[承認] Q&A「{pending['question']}」を承認しました")
+        return pending
 
-                print(f"[承認] Q&A「{pending['question']}」を承認しました")
-                return True
-        return False
+    def append_faq_to_csv(self, faq: dict) -> None:
+        """FAQ1件をCSVの末尾に追記する（承認のたびに全件を書き直さない）"""
+        try:
+            write_header = (not os.path.exists(self.csv_file)
+                            or os.path.getsize(self.csv_file) == 0)
+            with open(self.csv_file, 'a', encoding='utf-8-sig' if write_header else 'utf-8', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=['question', 'answer', 'keywords', 'category'], extrasaction='ignore')
+                if write_header:
+                    writer.writeheader()
+                writer.writerow({
+                    'question': faq['question'],
+                    'answer': faq['answer'],
+                    'keywords': faq.get('keywords', ''),
+                    'category': faq.get('category', '一般')
+                })
+        except Exception as e:
+            print(f"FAQ追記エラー: {e}")
 
     def reject_pending_qa(self, qa_id: str) -> bool:
         """承認待ちQ&Aを却下"""
-        for i, pending in enumerate(self.pending_qa):
-            if pending['id'] == qa_id:
-                rejected_question = pending['question']
-                del self.pending_qa[i]
-                self.save_pending_qa()
-                print(f"[却下] Q&A「{rejected_question}」を却下しました")
-                return True
-        return False
+        pending = self.pending_qa_by_id.get(qa_id)
+        if pending is None:
+            return False
+
+        self.pending_qa.remove(pending)
+        del self.pending_qa_by_id[qa_id]
+        self.save_pending_qa()
+        print(f"[却下] Q&A「{pending['question']}」を却下しました")
+        return True
 
     def edit_pending_qa(self, qa_id: str, question: str = None, answer: str = None, keywords: str = None, category: str = None) -> bool:
         """承認待ちQ&Aを編集"""
-        for pending in self.pending_qa:
-            if pending['id'] == qa_id:
-                if question:
-                    pending['question'] = question
-                if answer:
-                    pending['answer'] = answer
-                if keywords is not None:
-                    pending['keywords'] = keywords
-                if category:
-                    pending['category'] = category
-
-                self.save_pending_qa()
-                print(f"[編集] 承認待ちQ&A「{qa_id}」を編集しました")
-                return True
-        return False
+        pending = self.pending_qa_by_id.get(qa_id)
+        if pending is None:
+            return False
+
+        if question:
+            pending['question'] = question
+        if answer:
+            pending['answer'] = answer
+        if keywords is not None:
+            pending['keywords'] = keywords
+        if category:
+            pending['category'] = category
+
+        self.save_pending_qa()
+        print(f"[編集] 承認待ちQ&A「{qa_id}」を編集しました")
+        return True
 
     def toggle_confirmation_request(self, qa_id: str) -> bool:
         """承認待ちQ&Aの確認依頼フラグを切り替え"""
-        for pending in self.pending_qa:
-            if pending['id'] == qa_id:
-                # 確認依頼フラグを切り替え（0/1のトグル）
-                current_value = pending.get('confirmation_request', '0')
-                pending['confirmation_request'] = '0' if current_value == '1' else '1'
-
-                self.save_pending_qa()
-                status = '依頼中' if pending['confirmation_request'] == '1' else '解除'
-                print(f"[確認依頼] 承認待ちFAQ「{qa_id}」の確認依頼を{status}にしました")
-                return True
-        return False
+        pending = self.pending_qa_by_id.get(qa_id)
+        if pending is None:
+            return False
+
+        # 確認依頼フラグを切り替え（0/1のトグル）
+        current_value = pending.get('confirmation_request', '0')
+        pending['confirmation_request'] = '0' if current_value == '1' else '1'
+
+        self.save_pending_qa()
+        status = '依頼中' if pending['confirmation_request'] == '1' else '解除'
+        print(f"[確認依頼] 承認待ちFAQ「{qa_id}」の確認依頼を{status}にしました")
+        return True
 
     def get_keyword_score(self, user_question: str, faq_question: str, faq_keywords: str = '') -> float:
         """キーワードベースのスコアを計算"""
@@ -269,21 +349,88 @@ class FAQSystem:
             return self.calculate_similarity(question1, question2)
 
         try:
-            # 埋め込みベクトルを計算
-            embeddings = self.semantic_model.encode([question1, question2])
-
-            # コサイン類似度を計算
-            from sklearn.metrics.pairwise import cosine_similarity
             import numpy as np
 
-            similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-
-            return float(similarity)
+            # 埋め込みはLRUキャッシュ経由で取得（同じ質問の再エンコードを省く）
+            # 正規化済みなのでコサイン類似度は内積そのもの
+            e1 = self._embed_cached(question1)
+            e2 = self._embed_cached(question2)
+            return float(np.dot(e1, e2))
         except Exception as e:
             print(f"[WARNING] セマンティック類似度計算エラー: {e}")
             print("[WARNING] 文字列ベース類似度にフォールバック")
             return self.calculate_similarity(question1, question2)
 
+    def _embed_cached(self, text: str):
+        """テキストの埋め込みをLRUキャッシュ付きで取得する（L2正規化済み）
+
+        生成時の重複チェックでは既存質問それぞれと新しい候補を繰り返し
+        比較するため、テキスト内容をキーに埋め込みを使い回すと
+        モデル呼び出しが「比較ごと」から「新規テキストごと」に減ります。
+        """
+        cached = self._embedding_cache.get(text)
+        if cached is not None:
+            self._embedding_cache.move_to_end(text)
+            return cached
+
+        import numpy as np
+        embedding = np.asarray(
+            self.semantic_model.encode([text], convert_to_tensor=False)[0],
+            dtype=np.float32
+        )
+        embedding /= (np.linalg.norm(embedding) + 1e-9)
+        self._embedding_cache[text] = embedding
+        while len(self._embedding_cache) > SEMANTIC_EMBED_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return embedding
+
+    def _warm_embedding_cache(self, texts) -> None:
+        """未キャッシュのテキストを1回のバッチエンコードでまとめて埋め込む
+
+        1件ずつのencode()はPython/モデル呼び出しのオーバーヘッドを
+        テキストごとに払うため、ミス分だけをバッチで計算して
+        キャッシュに積んでおく。
+        """
+        if self.semantic_model is None:
+            return
+
+        misses = [t for t in dict.fromkeys(texts)
+                  if t and t not in self._embedding_cache]
+        if not misses:
+            return
+
+        try:
+            import numpy as np
+            embeddings = self.semantic_model.encode(
+                misses, batch_size=64, convert_to_tensor=False)
+            for text, embedding in zip(misses, embeddings):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                embedding /= (np.linalg.norm(embedding) + 1e-9)
+                self._embedding_cache[text] = embedding
+            while len(self._embedding_cache) > SEMANTIC_EMBED_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        except Exception as e:
+            print(f"[WARNING] 埋め込みバッチ計算エラー: {e}")
+
+    def semantic_similarities(self, question: str, texts: list):
+        """questionと各テキストのコサイン類似度をまとめて計算する
+
+        N件をPythonループで1件ずつ比較する代わりに、正規化済み埋め込みを
+        行列に積んで1回の行列積（BLAS）でN件分のスコアを返す。
+        モデルが使えない場合はNone（呼び出し側でフォールバック）。
+        """
+        if self.semantic_model is None or not texts:
+            return None
+        try:
+            import numpy as np
+            self._warm_embedding_cache(texts)
+            query = self._embed_cached(question)
+            matrix = np.vstack([self._embed_cached(text) for text in texts])
+            return matrix @ query
+        except Exception as e:
+            print(f"[WARNING] 類似度一括計算エラー: {e}")
+            return None
+
     def _extract_important_keywords(self, question: str) -> set:
         """質問から重要なキーワードを抽出"""
         # ビザ種類
@@ -368,13 +515,13 @@ class FAQSystem:
             with open(self.csv_file, 'w', encoding='utf-8-sig', newline='') as file:
                 writer = csv.DictWriter(file, fieldnames=['question', 'answer', 'keywords', 'category'])
                 writer.writeheader()
-                for faq in self.faq_data:
-                    writer.writerow({
-                        'question': faq['question'],
-                        'answer': faq['answer'],
-                        'keywords': faq.get('keywords', ''),
-                        'category': faq.get('category', '一般')
-                    })
+                # writerows()なら行のイテレーションがCレベルで回る
+                writer.writerows({
+                    'question': faq['question'],
+                    'answer': faq['answer'],
+                    'keywords': faq.get('keywords', ''),
+                    'category': faq.get('category', '一般')
+                } for faq in self.faq_data)
             print("FAQデータを保存しました。")
         except Exception as e:
             print(f"保存エラー: {e}")
@@ -407,6 +554,18 @@ class FAQSystem:
             return True
         return False
 
+    def delete_faqs(self, indices) -> int:
+        """複数のFAQを1パスでまとめて削除し、削除件数を返す
+
+        降順popの繰り返しはO(K*N)の要素シフトになるため、
+        setで照合しながらリストを1回だけ作り直す。
+        """
+        drop = {idx for idx in indices if 0 <= idx < len(self.faq_data)}
+        if not drop:
+            return 0
+        self.faq_data = [faq for i, faq in enumerate(self.faq_data) if i not in drop]
+        return len(drop)
+
     def show_all_faqs(self) -> None:
         """すべてのFAQを表示"""
         print("\n=== 現在のFAQデータ ===")
@@ -417,8 +576,6 @@ class FAQSystem:
 
     def save_unsatisfied_qa(self, user_question: str, matched_question: str, matched_answer: str, timestamp: str = None) -> None:
         """不満足なQ&Aを別ファイルに保存"""
-        import datetime
-        import os
 
         if not timestamp:
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -449,15 +606,52 @@ class FAQSystem:
             print(f"記録エラー: {e}")
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """PDFからテキストを抽出"""
+        """PDFからテキストを抽出（同一ファイルならキャッシュを返す）
+
+        キーは(絶対パス, mtime, サイズ)。デバッグモードでは毎回同じ
+        手引きPDFを読むため、2回目以降の生成でパース処理が丸ごと省ける。
+        """
+        try:
+            stat = os.stat(pdf_path)
+            cache_key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            cache_key = None
+
+        if cache_key is not None:
+            cached = self._pdf_text_cache.get(cache_key)
+            if cached is not None:
+                print(f"[INFO] PDFテキストをキャッシュから使用: {os.path.basename(pdf_path)}")
+                return cached
+
+        text = self._extract_text_from_pdf_uncached(pdf_path)
+        if cache_key is not None and text:
+            self._pdf_text_cache[cache_key] = text
+            # 直近数ファイル分だけ保持（生成対象PDFは高々数件）
+            while len(self._pdf_text_cache) > 4:
+                self._pdf_text_cache.pop(next(iter(self._pdf_text_cache)))
+        return text
+
+    def _extract_text_from_pdf_uncached(self, pdf_path: str) -> str:
+        """PDFからテキストを抽出
+
+        PyMuPDF（Cバックエンド）があれば優先して使う。PyPDF2の
+        Pythonオブジェクト走査より数倍〜十数倍速い。
+        """
+        try:
+            import fitz  # PyMuPDF（RAG側のpdf_processorと同じバックエンド）
+            with fitz.open(pdf_path) as doc:
+                return "\n".join(page.get_text() for page in doc) + "\n"
+        except ImportError:
+            pass  # PyPDF2にフォールバック
+        except Exception as e:
+            print(f"PDF読み込みエラー(PyMuPDF) {pdf_path}: {e}")
+
         try:
             import PyPDF2
-            text = ""
             with open(pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+                # ページごとの += 連結はO(N^2)になるためjoinでまとめる
+                return "\n".join(page.extract_text() or "" for page in reader.pages) + "\n"
         except ImportError:
             print("PyPDF2がインストールされていません。pip install PyPDF2を実行してください")
             return ""
@@ -468,7 +662,6 @@ class FAQSystem:
     def load_reference_documents(self) -> str:
         """参考資料を読み込む（PDF、TXT対応）"""
         try:
-            import os
             reference_content = ""
 
             # 参考資料ディレクトリから文書を読み込み
@@ -523,12 +716,9 @@ class FAQSystem:
     def generate_improved_qa_with_claude(self, user_question: str, current_answer: str, use_references: bool = True) -> dict:
         """ClaudeでQ&Aを改善生成"""
         try:
-            import requests
-            import json
-            import os
 
             # Claude API設定（環境変数から取得）
-            api_key = os.getenv('CLAUDE_API_KEY')
+            api_key = CLAUDE_API_KEY
             if not api_key:
                 print("CLAUDE_API_KEY未設定。モック改善機能を使用します...")
                 return self._mock_claude_improvement(user_question, current_answer)
@@ -600,7 +790,6 @@ class FAQSystem:
             }
 
             # JSONをダンプして確実にエスケープする
-            import json
             json_data = json.dumps(data, ensure_ascii=False)
 
             response = requests.post(
@@ -617,14 +806,13 @@ class FAQSystem:
                 print(f"[DEBUG] Claude レスポンス内容（最初の200文字）: {content[:200]}...")
 
                 # JSON部分を抽出
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                json_match = _JSON_OBJECT_RE.search(content)
                 if json_match:
                     # 改行文字を適切にエスケープ
                     json_str = json_match.group()
                     # 文字列内の改行をエスケープ（JSONパースエラーを防ぐ）
                     # まず正規表現で文字列値内の改行を検出して置換
-                    json_str = re.sub(r'("(?:[^"\\]|\\.)*?")', lambda m: m.group(1).replace('\n', '\\n').replace('\r', '\\r'), json_str)
+                    json_str = _JSON_STRING_RE.sub(lambda m: m.group(1).replace('\n', '\\n').replace('\r', '\\r'), json_str)
 
                     try:
                         qa_data = json.loads(json_str)
@@ -648,7 +836,7 @@ class FAQSystem:
             print(f"[DEBUG] 例外が発生、モック機能に切り替えます")
             return self._mock_claude_improvement(user_question, current_answer)
 
-    def auto_improve_qa(self, user_question: str, matched_question: str, matched_answer: str) -> bool:
+    def auto_improve_qa(self, user_question: str, matched_question: str, matched_answer: str, timestamp: str = None) -> bool:
         """不満足なQ&Aを自動改善して承認待ちキューに追加"""
         print("Claude でQ&Aを自動改善中...")
 
@@ -661,7 +849,8 @@ class FAQSystem:
                 answer=improved_qa['answer'],
                 keywords=improved_qa.get('keywords', ''),
                 category=improved_qa.get('category', 'AI生成'),
-                user_question=user_question
+                user_question=user_question,
+                timestamp=timestamp
             )
 
             print(f"[追加] 新しいQ&Aを承認待ちキューに追加しました (ID: {qa_id}):")
@@ -740,10 +929,81 @@ class FAQSystem:
             else:
                 self.faq_embeddings = None
 
+            # 類似度スキャン用のint8量子化行列を構築
+            self._quantize_faq_embeddings()
+
+            # セントロイドによる事前絞り込み用のクラスタを構築
+            self._build_faq_centroids()
+
         except Exception as e:
             print(f"[WARNING] FAQベクトル化エラー: {e}")
             self.faq_embeddings = None
 
+    def _quantize_faq_embeddings(self):
+        """FAQ埋め込みをベクトル毎のスケール付きint8に量子化する
+
+        量子化前にL2正規化しておくことで、int8同士の整数内積を
+        スケールで復元した値がそのままコサイン類似度の近似になる。
+        行列のメモリはfloat32の1/4になり、スキャン時の帯域も減る。
+        """
+        self.faq_embeddings_q = None
+        self.faq_embedding_scales = None
+
+        if self.faq_embeddings is None or len(self.faq_embeddings) == 0:
+            return
+
+        try:
+            import numpy as np
+
+            vecs = np.asarray(self.faq_embeddings, dtype=np.float32)
+            norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            unit = vecs / norms
+
+            scales = np.max(np.abs(unit), axis=1, keepdims=True) / 127.0
+            scales[scales == 0] = 1.0
+            self.faq_embeddings_q = np.round(unit / scales).astype(np.int8)
+            self.faq_embedding_scales = scales.astype(np.float32).flatten()
+        except Exception as e:
+            print(f"[WARNING] FAQ埋め込み量子化エラー: {e}")
+            self.faq_embeddings_q = None
+            self.faq_embedding_scales = None
+
+    def _build_faq_centroids(self):
+        """FAQ埋め込みを約√N個のクラスタにまとめてセントロイドを保持する
+
+        類似FAQ検索はまずセントロイドと比較して上位クラスタに絞り、
+        そのメンバーだけ本計算する（比較対象がNから約√Nに減る）。
+        """
+        self.faq_centroids = None
+        self.faq_cluster_members = {}
+
+        n = 0 if self.faq_embeddings is None else len(self.faq_embeddings)
+        if n < 50:
+            # 少数なら全件比較のほうが速い
+            return
+
+        try:
+            import math
+            import numpy as np
+            from sklearn.cluster import MiniBatchKMeans
+
+            n_clusters = max(2, int(math.sqrt(n)))
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3, random_state=0)
+            labels = kmeans.fit_predict(np.asarray(self.faq_embeddings))
+
+            members = {}
+            for idx, label in enumerate(labels):
+                members.setdefault(int(label), []).append(idx)
+
+            self.faq_centroids = kmeans.cluster_centers_.astype(np.float32)
+            self.faq_cluster_members = members
+            print(f"[INFO] FAQセントロイド構築完了: {n_clusters}クラスタ")
+        except Exception as e:
+            print(f"[WARNING] FAQセントロイド構築エラー: {e}")
+            self.faq_centroids = None
+            self.faq_cluster_members = {}
+
     def _find_similar_faqs(self, window_text: str, top_k: int = 5) -> list:
         """ウィンドウテキストと類似する承認済みFAQを検索"""
         if not self.semantic_model or not self.faq_data:
@@ -764,20 +1024,45 @@ class FAQSystem:
             # ウィンドウテキストをベクトル化
             window_embedding = self.semantic_model.encode([window_text], convert_to_tensor=False)
 
-            # コサイン類似度を計算
-            similarities = cosine_similarity(window_embedding, self.faq_embeddings)[0]
+            if self.faq_centroids is not None:
+                # セントロイドとの類似度で上位2クラスタに絞り、メンバーだけ本計算
+                centroid_scores = cosine_similarity(window_embedding, self.faq_centroids)[0]
+                top_clusters = np.argsort(centroid_scores)[::-1][:2]
+                candidate_indices = [idx for c in top_clusters
+                                     for idx in self.faq_cluster_members.get(int(c), [])]
+            else:
+                candidate_indices = list(range(len(self.faq_embeddings)))
+
+            if self.faq_embeddings_q is not None:
+                # int8行列との整数内積をスケールで復元してコサイン類似度を近似
+                query = np.asarray(window_embedding[0], dtype=np.float32)
+                query_norm = np.linalg.norm(query)
+                if query_norm > 0:
+                    query = query / query_norm
+                q_scale = float(np.max(np.abs(query))) / 127.0
+                if q_scale == 0:
+                    q_scale = 1.0
+                q_int = np.round(query / q_scale).astype(np.int8)
+                raw_scores = self.faq_embeddings_q[candidate_indices].astype(np.int32) @ q_int.astype(np.int32)
+                similarities = (raw_scores.astype(np.float32)
+                                * self.faq_embedding_scales[candidate_indices] * q_scale)
+            else:
+                # 量子化行列がない場合はfloat32でコサイン類似度を計算
+                candidate_matrix = np.asarray(self.faq_embeddings)[candidate_indices]
+                similarities = cosine_similarity(window_embedding, candidate_matrix)[0]
 
             # TOP K のインデックスを取得
-            top_indices = np.argsort(similarities)[::-1][:top_k]
+            top_positions = np.argsort(similarities)[::-1][:top_k]
 
             # 類似FAQを返す（類似度スコア付き）
             similar_faqs = []
-            for idx in top_indices:
-                if similarities[idx] > 0.3:  # 類似度閾値: 0.3以上のみ
+            for pos in top_positions:
+                if similarities[pos] > 0.3:  # 類似度閾値: 0.3以上のみ
+                    idx = candidate_indices[pos]
                     similar_faqs.append({
                         'question': self.faq_embeddings_texts[idx]['question'],
                         'answer': self.faq_embeddings_texts[idx]['answer'],
-                        'similarity': float(similarities[idx])
+                        'similarity': float(similarities[pos])
                     })
 
             if similar_faqs:
@@ -791,10 +1076,6 @@ class FAQSystem:
 
     def _generate_qa_from_window(self, window_text: str, category: str, used_questions: list = None, window_rejected_questions: list = None) -> dict:
         """1段階生成: ウィンドウテキストから直接Q&Aを1つ生成"""
-        import requests
-        import json
-        import os
-        import csv
 
         if used_questions is None:
             used_questions = []
@@ -930,7 +1211,7 @@ class FAQSystem:
 """
 
         try:
-            api_key = self.claude_api_key or os.getenv('CLAUDE_API_KEY')
+            api_key = self.claude_api_key or CLAUDE_API_KEY
             if not api_key:
                 print("[ERROR] CLAUDE_API_KEY未設定")
                 return None
@@ -970,9 +1251,8 @@ class FAQSystem:
                 if content.startswith("```json"):
                     content = content.replace("```json", "").replace("```", "").strip()
 
-                import re
                 # 単一オブジェクトを優先してパース（{...} 形式）
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                json_match = _JSON_OBJECT_RE.search(content)
                 if json_match:
                     faq_data = json.loads(json_match.group())
                     if faq_data and 'question' in faq_data and faq_data['question']:
@@ -980,7 +1260,7 @@ class FAQSystem:
                         return [faq_data]  # リストに変換して返す
 
                 # 単一オブジェクトが見つからない場合、配列としてパースを試みる（後方互換性）
-                json_match = re.search(r'\[.*\]', content, re.DOTALL)
+                json_match = _JSON_ARRAY_RE.search(content)
                 if json_match:
                     faq_list = json.loads(json_match.group())
                     if faq_list and isinstance(faq_list, list) and len(faq_list) > 0:
@@ -999,9 +1279,6 @@ class FAQSystem:
 
     def _extract_scenarios(self, window_text: str, used_scenarios: list = None) -> list:
         """ステップ1: ウィンドウテキストからシナリオ（実際の悩み・疑問）を抽出"""
-        import requests
-        import json
-        import os
 
         if used_scenarios is None:
             used_scenarios = []
@@ -1058,7 +1335,7 @@ JSON配列のみを出力してください：
 """
 
         try:
-            api_key = self.claude_api_key or os.getenv('CLAUDE_API_KEY')
+            api_key = self.claude_api_key or CLAUDE_API_KEY
             if not api_key:
                 print("[ERROR] CLAUDE_API_KEY未設定")
                 return []
@@ -1111,9 +1388,6 @@ JSON配列のみを出力してください：
 
     def _generate_question_from_scenario(self, scenario: str, answer_window: str, category: str, used_questions: list = None) -> dict:
         """ステップ2: シナリオから実用的な質問を生成"""
-        import requests
-        import json
-        import os
 
         if used_questions is None:
             used_questions = []
@@ -1190,7 +1464,7 @@ JSON配列のみを出力してください：
 """
 
         try:
-            api_key = self.claude_api_key or os.getenv('CLAUDE_API_KEY')
+            api_key = self.claude_api_key or CLAUDE_API_KEY
             if not api_key:
                 print("[ERROR] CLAUDE_API_KEY未設定")
                 return None
@@ -1230,8 +1504,7 @@ JSON配列のみを出力してください：
                 if content.startswith("```json"):
                     content = content.replace("```json", "").replace("```", "").strip()
 
-                import re
-                json_match = re.search(r'\[.*\]', content, re.DOTALL)
+                json_match = _JSON_ARRAY_RE.search(content)
                 if json_match:
                     faq_list = json.loads(json_match.group())
                     if faq_list:
@@ -1251,15 +1524,10 @@ JSON配列のみを出力してください：
     def generate_faqs_from_document(self, pdf_path: str, num_questions: int = 3, category: str = "AI生成") -> list:
         """PDFドキュメントからFAQを自動生成（ランダムウィンドウ方式）"""
         try:
-            import requests
-            import json
-            import os
 
             # Claude API設定（web_app.pyから渡されたキーを使用）
-            api_key = self.claude_api_key or os.getenv('CLAUDE_API_KEY')
+            api_key = self.claude_api_key or CLAUDE_API_KEY
             print(f"[DEBUG] CLAUDE_API_KEY check: {'SET' if api_key else 'NOT SET'}")
-            if api_key:
-                print(f"[DEBUG] API key starts with: {api_key[:10]}...")
             if not api_key:
                 print("[ERROR] CLAUDE_API_KEY未設定。モック生成機能を使用します...")
                 return self._mock_faq_generation(num_questions, category)
@@ -1332,6 +1600,10 @@ JSON配列のみを出力してください：
             print(f"[DEBUG] 重複チェック対象 - 既存FAQ: {len(existing_questions)}件, 承認待ち: {len(pending_questions)}件")
             print(f"[DEBUG] ユニークな既存質問: {len(unique_questions)}件")
 
+            # 既存質問の埋め込みを1回のバッチエンコードでまとめて用意しておく
+            # （重複チェックループ内の1件ずつのモデル呼び出しをなくす）
+            self._warm_embedding_cache(unique_questions)
+
             # FAQ生成開始
             all_faqs = []
             headers = {
@@ -1458,17 +1730,18 @@ JSON配列のみを出力してください：
                         dup_check_start = time.time()
                         print(f"[TIME] 重複チェック開始 (既存質問数: {len(unique_questions)}件)...")
 
-                        # 既存FAQとの重複チェック（最適化版：早期リターン）
-                        checked_count = 0
-                        for existing_q in unique_questions:
-                            checked_count += 1
-                            # 進捗を100件ごとに表示
-                            if checked_count % 100 == 0:
-                                print(f"[TIME] 重複チェック進捗: {checked_count}/{len(unique_questions)}件チェック済み")
-
-                            # セマンティック類似度で重複判定
-                            similarity = self.calculate_semantic_similarity(current_question, existing_q)
+                        # 既存FAQとの重複チェック
+                        # 類似度は1回の行列積でまとめて計算し、0.80以上の候補だけ精査する
+                        batch_scores = self.semantic_similarities(current_question, unique_questions)
+                        if batch_scores is not None:
+                            candidates = [(q, float(s)) for q, s
+                                          in zip(unique_questions, batch_scores) if s >= 0.80]
+                        else:
+                            # モデルなし: 従来どおり1件ずつ計算（breakまでの遅延評価）
+                            candidates = ((q, self.calculate_semantic_similarity(current_question, q))
+                                          for q in unique_questions)
 
+                        for existing_q, similarity in candidates:
                             # キーワードベースの判定（閾値を緩和して多様性を確保）
                             if similarity >= 0.95:
                                 # 文字列がほぼ同一 → 重複
@@ -1603,6 +1876,13 @@ JSON配列のみを出力してください：
                             # ウィンドウ情報を追加
                             faq["window_info"] = f"Q範囲: {window_pair['q_range']} / A範囲: {window_pair['a_range']} / 位置: {selected_position}"
                             all_faqs.append(faq)
+
+                            # 受理したFAQを呼び出し元へ逐次通知（完了を待たずにUIへ流せる）
+                            if self.faq_accepted_callback:
+                                try:
+                                    self.faq_accepted_callback(faq)
+                                except Exception as cb_error:
+                                    print(f"[DEBUG] FAQ受理コールバックエラー: {cb_error}")
                             unique_questions.append(current_question)  # 次回の重複チェック用に追加
                             window_duplicate_count[selected_position] = 0  # リセット
 
@@ -1666,10 +1946,7 @@ JSON配列のみを出力してください：
     def generate_answer_for_question(self, question: str, window_position: int, category: str = "AI生成") -> dict:
         """指定された質問に対して回答のみを生成（回答作り直し機能用）"""
         try:
-            import os
             import glob
-            import requests
-            import json
 
             # PDFパスを取得
             pdf_dir = 'reference_docs'
@@ -1706,7 +1983,6 @@ JSON配列のみを出力してください：
             # rejected_patterns.csv から不適切な回答パターンを読み込む
             rejected_answers = []
             rejected_file = 'rejected_patterns.csv'
-            import csv
             try:
                 if os.path.exists(rejected_file):
                     with open(rejected_file, 'r', encoding='utf-8') as f:
@@ -1763,7 +2039,7 @@ JSON配列のみを出力してください：
 """
 
             # Claude APIで回答を生成
-            api_key = self.claude_api_key or os.getenv('CLAUDE_API_KEY')
+            api_key = self.claude_api_key or CLAUDE_API_KEY
             if not api_key:
                 print("[ERROR] CLAUDE_API_KEY未設定")
                 return {'status': 'error', 'reason': 'CLAUDE_API_KEY未設定'}
@@ -1827,7 +2103,6 @@ JSON配列のみを出力してください：
     def generate_faq_for_window(self, window_position: int, category: str = "AI生成") -> dict:
         """指定されたウィンドウ位置でFAQを1つ生成（作り直し機能用）"""
         try:
-            import os
             import glob
 
             # PDFパスを取得（reference_docs/ から最初のPDFを探す）
@@ -2155,19 +2430,40 @@ def main():
         print("-" * 50)
 
 def find_similar_faqs(faq_system, question: str, threshold: float = 0.6, max_results: int = 5) -> list:
-    """既存のFAQから類似する質問を検出"""
+    """既存のFAQから類似する質問を検出
+
+    全件走査は変わらないが、ratio()のO(L^2)計算に入る前に
+    real_quick_ratio()/quick_ratio()の上界で枝刈りするため、
+    しきい値に届きようのない大半の行は安価な比較だけで済む。
+    """
     similar_faqs = []
 
+    matcher = difflib.SequenceMatcher(None)
+    matcher.set_seq1(question.lower())
+
+    # ループ内の属性解決を避けるためローカル変数に束縛しておく
+    get_keyword_score = faq_system.get_keyword_score
+    set_seq2 = matcher.set_seq2
+    real_quick_ratio = matcher.real_quick_ratio
+    quick_ratio = matcher.quick_ratio
+    ratio = matcher.ratio
+    append = similar_faqs.append
+
     for faq in faq_system.faq_data:
-        # 文字列類似度とキーワードスコアを組み合わせて計算
-        similarity = faq_system.calculate_similarity(question, faq['question'])
-        keyword_score = faq_system.get_keyword_score(question, faq['question'], faq.get('keywords', ''))
+        keyword_score = get_keyword_score(question, faq['question'], faq.get('keywords', ''))
+        set_seq2(faq['question'].lower())
+
+        # real_quick_ratio → quick_ratio はいずれも ratio の上界。
+        # 総合スコアの上界がしきい値未満なら本計算を省く
+        if (real_quick_ratio() * 0.7 + keyword_score * 0.3 < threshold
+                or quick_ratio() * 0.7 + keyword_score * 0.3 < threshold):
+            continue
 
         # 総合スコア（類似度70%、キーワード30%の重み付け）
-        total_score = similarity * 0.7 + keyword_score * 0.3
+        total_score = ratio() * 0.7 + keyword_score * 0.3
 
         if total_score >= threshold:
-            similar_faqs.append({
+            append({
                 'question': faq['question'],
                 'answer': faq['answer'],
                 'keywords': faq.get('keywords', ''),
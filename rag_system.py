@@ -3,6 +3,7 @@ RAG System Core
 Handles question answering using vector search and Claude API
 """
 
+import io
 import os
 from typing import List, Dict, Tuple
 from anthropic import Anthropic
@@ -17,6 +18,15 @@ CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
 TOP_K_CHUNKS = int(os.getenv('TOP_K_CHUNKS', 10))
 FINAL_CHUNKS = int(os.getenv('FINAL_CHUNKS', 5))
 
+# Static instruction block, kept byte-identical across calls so
+# Anthropic's prompt caching can reuse it (cache_control: ephemeral)
+STATIC_RULES = """あなたは提供された参照資料のみに基づいて質問に回答するアシスタントです。
+
+【重要なルール】
+1. 参照情報に書かれている内容のみを使って回答してください
+2. 参照情報に書かれていない内容は推測しないでください
+3. 答えられない場合は「提供された資料に記載されておりません」と答えてください"""
+
 
 class RAGSystem:
     def __init__(self):
@@ -99,9 +109,14 @@ class RAGSystem:
         # Expand query with keywords
         expanded_query = self.expand_query(query)
 
+        # Encode the expanded query once and reuse the embedding
+        query_embedding = self.vector_store.embed_query(expanded_query)
+
         # Use hybrid search (vector + keyword)
         # alpha=0.3 gives more weight to keyword matching for better precision
-        results = self.vector_store.hybrid_search(expanded_query, k=k, alpha=0.3)
+        results = self.vector_store.hybrid_search_with_embedding(
+            query_embedding, expanded_query, k=k, alpha=0.3
+        )
 
         # Filter and deduplicate
         filtered_results = self.vector_store.filter_and_deduplicate(
@@ -159,7 +174,8 @@ class RAGSystem:
                         "role": "user",
                         "content": prompt
                     }
-                ]
+                ],
+                extra_headers={"anthropic-beta": "prompt-caching-2024-07-31"}
             )
 
             answer_text = response.content[0].text
@@ -190,23 +206,77 @@ class RAGSystem:
                 'error': str(e)
             }
 
+    def generate_answer_stream(self, query: str, relevant_chunks: List[Dict]):
+        """
+        Generate answer using Claude API, streaming text as it is produced
+
+        Yields tokens as they arrive so callers can display the answer
+        incrementally instead of waiting for the full generation.
+
+        Args:
+            query: User's question
+            relevant_chunks: List of relevant text chunks
+
+        Yields:
+            Answer text fragments
+        """
+        print("Generating answer with Claude API (streaming)...")
+
+        # Build context from relevant chunks
+        context = self._build_context(relevant_chunks)
+
+        # Build prompt with hallucination prevention
+        prompt = self._build_prompt(query, context, relevant_chunks)
+
+        try:
+            with self.claude_client.messages.stream(
+                model="claude-sonnet-4-5-20250929",
+                max_tokens=2000,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                extra_headers={"anthropic-beta": "prompt-caching-2024-07-31"}
+            ) as stream:
+                for text in stream.text_stream:
+                    yield text
+
+            print("Answer generated successfully")
+
+        except Exception as e:
+            import traceback
+            import sys
+            error_details = traceback.format_exc()
+            print(f"\n{'='*60}", file=sys.stderr)
+            print(f"ERROR generating answer:", file=sys.stderr)
+            print(error_details, file=sys.stderr)
+            print(f"{'='*60}\n", file=sys.stderr)
+            sys.stderr.flush()
+            yield "申し訳ございません。回答の生成中にエラーが発生しました。"
+
     def _build_context(self, chunks: List[Dict]) -> str:
         """Build context string from chunks"""
-        context_parts = []
+        # Write into a single buffer to avoid per-chunk intermediate strings
+        buf = io.StringIO()
 
         for i, chunk in enumerate(chunks, 1):
-            context_parts.append(
+            buf.write(
                 f"【参照情報 {i}】\n"
                 f"ファイル: {chunk['file_name']}\n"
                 f"ページ: {chunk['page_num']}\n"
-                f"内容: {chunk['text']}\n"
+                f"内容: {chunk['text']}\n\n"
             )
 
-        return "\n".join(context_parts)
+        return buf.getvalue().rstrip("\n") + "\n" if chunks else ""
 
-    def _build_prompt(self, query: str, context: str, chunks: List[Dict]) -> str:
+    def _build_prompt(self, query: str, context: str, chunks: List[Dict]) -> List[Dict]:
         """
-        Build prompt with hallucination prevention measures
+        Build message content blocks with hallucination prevention measures
+
+        The static instruction block is marked with cache_control so
+        Anthropic's prompt caching can reuse it on warm calls.
 
         Args:
             query: User's question
@@ -214,16 +284,9 @@ class RAGSystem:
             chunks: List of chunk metadata
 
         Returns:
-            Complete prompt string
+            List of content blocks for the Claude API
         """
-        prompt = f"""あなたは提供された参照資料のみに基づいて質問に回答するアシスタントです。
-
-【重要なルール】
-1. 参照情報に書かれている内容のみを使って回答してください
-2. 参照情報に書かれていない内容は推測しないでください
-3. 答えられない場合は「提供された資料に記載されておりません」と答えてください
-
-【参照情報】
+        dynamic_part = f"""【参照情報】
 {context}
 
 【質問】
@@ -232,7 +295,17 @@ class RAGSystem:
 【回答】
 参照情報に基づいて、簡潔に回答してください。"""
 
-        return prompt
+        return [
+            {
+                "type": "text",
+                "text": STATIC_RULES,
+                "cache_control": {"type": "ephemeral"}
+            },
+            {
+                "type": "text",
+                "text": dynamic_part
+            }
+        ]
 
     def _format_sources(self, chunks: List[Dict]) -> List[Dict]:
         """Format source information"""
@@ -283,9 +356,43 @@ class RAGSystem:
 
         return result
 
+    def answer_question_stream(self, query: str):
+        """
+        Streaming pipeline: search, then yield the answer as it is generated
+
+        Args:
+            query: User's question
+
+        Yields:
+            Answer text fragments
+        """
+        print("\n" + "="*60)
+        print(f"Question: {query}")
+        print("="*60)
+
+        # Step 1: Search for relevant chunks
+        relevant_chunks = self.search_relevant_chunks(query, k=TOP_K_CHUNKS)
+
+        if not relevant_chunks:
+            yield "関連する情報が見つかりませんでした。別の質問をお試しください。"
+            return
+
+        # Step 2: Stream the answer
+        yield from self.generate_answer_stream(query, relevant_chunks)
+
 
 def main():
     """Test the RAG system"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="RAG system test runner")
+    parser.add_argument('--batch', action='store_true',
+                        help='Run all queries without prompting (for benchmarking/CI)')
+    parser.add_argument('--queries-file',
+                        help='Text file with one query per line (default: built-in test queries)')
+    args = parser.parse_args()
+
     print("\n" + "="*60)
     print("Testing RAG System")
     print("="*60 + "\n")
@@ -305,8 +412,16 @@ def main():
         "東京の人口は何人ですか？"
     ]
 
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            test_queries = [line.strip() for line in f if line.strip()]
+
+    timings = []
+
     for query in test_queries:
+        t0 = time.perf_counter()
         result = rag.answer_question(query)
+        timings.append((query, time.perf_counter() - t0))
 
         print(f"\n質問: {result['query']}")
         print("-" * 60)
@@ -322,8 +437,15 @@ def main():
 
         print("\n" + "="*60 + "\n")
 
-        # Wait for user input to continue
-        input("Press Enter to continue to next question...")
+        # Wait for user input to continue (skipped in batch mode)
+        if not args.batch:
+            input("Press Enter to continue to next question...")
+
+    if args.batch:
+        # Emit per-query timings as CSV for regression tracking
+        print("query,seconds")
+        for query, elapsed in timings:
+            print(f"\"{query}\",{elapsed:.3f}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""
+Debug: Dump chunks retrieved for one or more queries
+
+Replaces the near-identical test_debug_chunks.py / test_debug_to_file.py /
+test_chunks_detail.py scripts. One RAGSystem instance is shared across all
+queries so model/index load time is paid once.
+
+Usage examples:
+    python tools/dump_chunks.py --query "E-2ビザの申請条件を教えて。"
+    python tools/dump_chunks.py --query "..." --k 30 --format file --output chunks_detail_hybrid.txt
+    python tools/dump_chunks.py --queries-file queries.txt --format file
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from rag_system import RAGSystem
+
+
+def format_chunks(query, relevant_chunks):
+    """Format retrieved chunks as display text"""
+    output = []
+    output.append("=" * 80)
+    output.append(f"質問: {query}")
+    output.append("=" * 80)
+    output.append(f"\n取得されたチャンク数: {len(relevant_chunks)}\n")
+
+    for i, chunk in enumerate(relevant_chunks, 1):
+        output.append(f"【チャンク {i}】")
+        output.append(f"ファイル: {chunk['file_name']}")
+        output.append(f"ページ: {chunk['page_num']}")
+        output.append(f"類似度: {chunk.get('similarity', 0.0):.4f}")
+        output.append(f"ベクトルスコア: {chunk.get('vector_score', 0):.4f}")
+        output.append(f"キーワードスコア: {chunk.get('keyword_score', 0):.4f}")
+        output.append(f"統合スコア: {chunk.get('combined_score', 0):.4f}")
+        output.append(f"内容:\n{chunk['text']}")
+        output.append("-" * 80)
+        output.append("")
+
+    return "\n".join(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="検索チャンクのデバッグダンプ")
+    parser.add_argument('--query', action='append', default=[],
+                        help='検索クエリ（複数指定可）')
+    parser.add_argument('--queries-file',
+                        help='1行1クエリのテキストファイル')
+    parser.add_argument('--k', type=int, default=10,
+                        help='取得するチャンク数（デフォルト: 10）')
+    parser.add_argument('--format', choices=['stdout', 'file'], default='stdout',
+                        help='出力先（デフォルト: stdout）')
+    parser.add_argument('--output', default='debug_chunks.txt',
+                        help='--format file 時の出力ファイル')
+    args = parser.parse_args()
+
+    queries = list(args.query)
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries.extend(line.strip() for line in f if line.strip())
+
+    if not queries:
+        queries = ["E-2ビザの申請条件を教えて。"]
+
+    # Initialize RAG system once and reuse it across all queries
+    rag = RAGSystem()
+    rag.load_knowledge_base()
+
+    dumps = []
+    for query in queries:
+        relevant_chunks = rag.search_relevant_chunks(query, k=args.k)
+        dumps.append(format_chunks(query, relevant_chunks))
+
+    if args.format == 'file':
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(dumps))
+        print(f"チャンク情報を {args.output} に保存しました（{len(queries)}クエリ）")
+    else:
+        print("\n".join(dumps))
+
+
+if __name__ == "__main__":
+    main()
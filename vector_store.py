@@ -3,14 +3,32 @@ Vector Store for RAG System
 Handles FAISS index creation, storage, and retrieval
 """
 
+import atexit
+import fcntl
+import heapq
 import os
 import pickle
+import threading
 import numpy as np
 import faiss
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+# Optional: multi-pattern keyword matching (pip install pyahocorasick)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional: Japanese morphological tokenizer (pip install 'fugashi[unidic-lite]')
+try:
+    import fugashi
+except ImportError:
+    fugashi = None
+
 # Load environment variables
 load_dotenv()
 
@@ -19,16 +37,97 @@ VECTOR_DB_PATH = os.getenv('VECTOR_DB_PATH', './vector_db/faiss_index.bin')
 TOP_K_CHUNKS = int(os.getenv('TOP_K_CHUNKS', 10))
 FINAL_CHUNKS = int(os.getenv('FINAL_CHUNKS', 5))
 
+# IVF+PQ index parameters (used once the corpus is large enough to train on)
+IVF_NLIST = int(os.getenv('IVF_NLIST', 0))  # 0 = auto (sqrt of corpus size)
+NPROBE = int(os.getenv('NPROBE', 16))
+PQ_M = int(os.getenv('PQ_M', 48))  # Sub-quantizers (must divide dimension)
+IVFPQ_MIN_VECTORS = int(os.getenv('IVFPQ_MIN_VECTORS', 10000))
+# Store flat-index vectors as fp16 (halves RAM, negligible ranking impact)
+FLAT_INDEX_FP16 = os.getenv('FLAT_INDEX_FP16', '1') == '1'
+
+# Embedding backend: 'torch' (default) or 'onnx' (int8-quantized, CPU-only)
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+
+# Query cache sizes (LRU)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 2048))
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 512))
+# Persist the query-embedding cache across restarts ('' disables)
+EMBEDDING_CACHE_FILE = os.getenv('EMBEDDING_CACHE_FILE', 'query_embedding_cache.pkl')
+
+# Reciprocal Rank Fusion constant (standard value from the RRF paper)
+RRF_K = 60
+
+# Thread pools for FAISS/torch. In multi-worker deployments set these to
+# cpu_count // num_workers to avoid oversubscription.
+FAISS_THREADS = int(os.getenv('FAISS_THREADS', os.cpu_count() or 1))
+TORCH_THREADS = int(os.getenv('TORCH_THREADS', os.cpu_count() or 1))
+
 
 class VectorStore:
     def __init__(self):
         """Initialize vector store with embedding model"""
-        print("Loading embedding model for vector store...")
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
+        # Tune thread counts before any encode/search work happens
+        faiss.omp_set_num_threads(FAISS_THREADS)
+        try:
+            import torch
+            torch.set_num_threads(TORCH_THREADS)
+        except ImportError:
+            pass
+
+        # Embedding model loads lazily on first use; keyword-only callers
+        # (health checks, admin tools) never pay the multi-second load
+        self._embedding_model = None
+        self._model_lock = threading.Lock()
         self.index = None
         self.chunks_metadata = []
+        # LRU caches for repeated queries; search cache entries are keyed on
+        # the index version so index changes invalidate them
+        self._embedding_cache = OrderedDict()
+        self._load_embedding_cache()
+        atexit.register(self._save_embedding_cache)
+        self._search_cache = OrderedDict()
+        self._index_version = 0
+        # N-gram postings for keyword search, rebuilt lazily on index changes
+        self._ngram_postings = None
+        self._postings_version = -1
+        # MeCab tagger, created lazily when fugashi is installed
+        self._mecab = None
         print("Vector store initialized")
 
+    @property
+    def embedding_model(self) -> SentenceTransformer:
+        """Embedding model, loaded on first access (double-checked lock)"""
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    print("Loading embedding model for vector store...")
+                    self._embedding_model = self._load_embedding_model()
+        return self._embedding_model
+
+    def _load_embedding_model(self) -> SentenceTransformer:
+        """
+        Load the embedding model with the configured backend
+
+        EMBED_BACKEND=onnx uses an int8-quantized ONNX export so CPU
+        inference can use VNNI int8 dot products (roughly 2x faster than
+        the PyTorch FP32 path). Falls back to PyTorch if the ONNX backend
+        is unavailable.
+        """
+        if EMBED_BACKEND == 'onnx':
+            try:
+                return SentenceTransformer(
+                    'paraphrase-multilingual-mpnet-base-v2',
+                    backend='onnx',
+                    model_kwargs={
+                        'file_name': 'onnx/model_qint8_avx512_vnni.onnx',
+                        'provider': 'CPUExecutionProvider'
+                    }
+                )
+            except Exception as e:
+                print(f"[WARNING] ONNX backend unavailable ({e}), falling back to PyTorch")
+
+        return SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
+
     def create_index(self, embeddings: np.ndarray, chunks: List[Dict]):
         """
         Create FAISS index from embeddings
@@ -39,21 +138,82 @@ class VectorStore:
         """
         print(f"Creating FAISS index with {len(embeddings)} vectors...")
 
-        # Get embedding dimension
-        dimension = embeddings.shape[1]
+        # No copy when the caller already provides float32
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        # Normalize so inner product equals cosine similarity
+        faiss.normalize_L2(embeddings)
 
-        # Create FAISS index (L2 distance)
-        self.index = faiss.IndexFlatL2(dimension)
+        # Build index (flat for small corpora, IVF+PQ once large enough)
+        self.index = self._build_index(embeddings)
 
         # Add vectors to index
-        self.index.add(embeddings.astype('float32'))
+        self.index.add(embeddings)
 
-        # Store metadata
+        # Store metadata (with cached lowercase text for keyword search)
+        for chunk in chunks:
+            chunk['_text_lower'] = chunk['text'].lower()
         self.chunks_metadata = chunks
+        self._index_version += 1
 
         print(f"FAISS index created successfully")
         print(f"Index size: {self.index.ntotal} vectors")
 
+    def _build_index(self, embeddings: np.ndarray, n_total: int = None) -> 'faiss.Index':
+        """
+        Build a FAISS index appropriate for the corpus size
+
+        Small corpora get an exhaustive flat index. Once there are enough
+        vectors to train on, an IVF+PQ index is built instead, compressing
+        each vector from 4*D bytes to PQ_M bytes and limiting the scan to
+        nprobe inverted lists.
+
+        Args:
+            embeddings: float32 array of (training) embeddings (N x D)
+            n_total: Total corpus size if embeddings is only a training
+                     sample (default: len(embeddings))
+
+        Returns:
+            Empty FAISS inner-product index (train() already called if needed);
+            embeddings must be L2-normalized before add so scores are cosine
+        """
+        n_vectors, dimension = embeddings.shape
+        if n_total is None:
+            n_total = n_vectors
+
+        if n_total < IVFPQ_MIN_VECTORS:
+            # Not enough data to train IVF/PQ reliably; the fp16 scalar
+            # quantizer halves vector storage versus a plain flat index
+            if FLAT_INDEX_FP16:
+                return faiss.IndexScalarQuantizer(
+                    dimension, faiss.ScalarQuantizer.QT_fp16,
+                    faiss.METRIC_INNER_PRODUCT
+                )
+            return faiss.IndexFlatIP(dimension)
+
+        nlist = IVF_NLIST if IVF_NLIST > 0 else max(1, int(n_total ** 0.5))
+
+        # Reuse the trained centroids of the current index when compatible:
+        # training is the expensive step and FAQ additions rarely shift the
+        # centroid distribution enough to matter
+        current = self.index
+        if (isinstance(current, faiss.IndexIVFPQ) and current.is_trained
+                and current.d == dimension and current.nlist == nlist):
+            print("Reusing trained IVF/PQ centroids from the current index...")
+            index = faiss.clone_index(current)
+            index.reset()  # Drop the vectors, keep the training
+            index.nprobe = NPROBE
+            return index
+
+        print(f"Building IVF+PQ index (nlist={nlist}, m={PQ_M}, nprobe={NPROBE})...")
+
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, 8,
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = NPROBE
+        return index
+
     def save_index(self, path: str = None):
         """
         Save FAISS index and metadata to disk
@@ -77,6 +237,12 @@ class VectorStore:
         with open(metadata_path, 'wb') as f:
             pickle.dump(self.chunks_metadata, f)
 
+        # Save n-gram postings so keyword search skips the build on startup
+        self._ensure_ngram_postings()
+        ngrams_path = path.replace('.bin', '_ngrams.pkl')
+        with open(ngrams_path, 'wb') as f:
+            pickle.dump({'ngram_postings': self._ngram_postings}, f)
+
         print(f"Index and metadata saved successfully")
 
     def load_index(self, path: str = None):
@@ -106,17 +272,111 @@ class VectorStore:
         print(f"Loading FAISS index from: {path}")
 
         # Load FAISS index
-        self.index = faiss.read_index(path)
+        # Memory-map the index file instead of reading it fully into RAM.
+        # The OS page cache handles residency, which keeps cold start fast
+        # on small-memory containers. Fall back to a normal read for index
+        # types that do not support mmap.
+        try:
+            self.index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[WARNING] Memory-mapped load failed ({e}), reading index into RAM")
+            self.index = faiss.read_index(path)
+
+        # Indexes persisted before the inner-product switch used IndexFlatL2;
+        # their scores are distances (lower = better) and must not be fed to
+        # search paths that expect cosine similarities. Set the legacy file
+        # aside and rebuild, since startup_init skips rebuilds while the file
+        # exists and the PDFs are unchanged.
+        if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            print("[WARNING] Loaded index uses the L2 metric (legacy build)")
+            print("[INFO] Rebuilding vector database with the inner-product metric...")
+            self.index = None
+            os.replace(path, path + '.l2-legacy')
+            try:
+                from startup_init import check_and_build_vector_db
+                if not check_and_build_vector_db() or not os.path.exists(path):
+                    raise RuntimeError(f"Failed to rebuild legacy L2 index: {path}")
+            except ImportError:
+                raise RuntimeError(
+                    f"Legacy L2 index set aside ({path}.l2-legacy); rebuild required"
+                )
+            return self.load_index(path)
 
         # Load metadata
         metadata_path = path.replace('.bin', '_metadata.pkl')
         with open(metadata_path, 'rb') as f:
             self.chunks_metadata = pickle.load(f)
+        self._index_version += 1
+
+        # Load persisted n-gram postings if available (rebuilt lazily otherwise)
+        ngrams_path = path.replace('.bin', '_ngrams.pkl')
+        if os.path.exists(ngrams_path):
+            try:
+                with open(ngrams_path, 'rb') as f:
+                    self._ngram_postings = pickle.load(f)['ngram_postings']
+                self._postings_version = self._index_version
+                print(f"N-gram postings loaded ({len(self._ngram_postings)} grams)")
+            except Exception as e:
+                print(f"[WARNING] Could not load n-gram postings: {e}")
+                self._ngram_postings = None
+                self._postings_version = -1
 
         print(f"Index loaded successfully")
         print(f"Index size: {self.index.ntotal} vectors")
         print(f"Metadata size: {len(self.chunks_metadata)} chunks")
 
+    def _load_embedding_cache(self):
+        """Warm the query-embedding cache from the previous run, if saved"""
+        if not EMBEDDING_CACHE_FILE:
+            return
+        try:
+            with open(EMBEDDING_CACHE_FILE, 'rb') as f:
+                cached = pickle.load(f)
+            if isinstance(cached, dict):
+                # Keep only the most recent entries if the size limit shrank
+                self._embedding_cache.update(list(cached.items())[-EMBEDDING_CACHE_SIZE:])
+                print(f"Loaded {len(self._embedding_cache)} cached query embeddings")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Embedding cache load failed: {e}")
+
+    def _save_embedding_cache(self):
+        """Persist the query-embedding cache so restarts keep their hits"""
+        if not EMBEDDING_CACHE_FILE or not self._embedding_cache:
+            return
+        try:
+            tmp_path = EMBEDDING_CACHE_FILE + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(dict(self._embedding_cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, EMBEDDING_CACHE_FILE)
+        except Exception as e:
+            print(f"Embedding cache save failed: {e}")
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Encode a query into an embedding vector
+
+        Args:
+            query: Query text
+
+        Returns:
+            Query embedding as a (1 x D) float32 array
+        """
+        cached = self._embedding_cache.get(query)
+        if cached is not None:
+            self._embedding_cache.move_to_end(query)
+            return cached
+
+        embedding = self.embedding_model.encode([query], convert_to_numpy=True)
+        embedding = embedding.astype(np.float32, copy=False)  # No-op copy for float32 output
+
+        self._embedding_cache[query] = embedding
+        if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+
+        return embedding
+
     def search(self, query: str, k: int = None) -> List[Dict]:
         """
         Search for similar chunks using a query
@@ -125,6 +385,37 @@ class VectorStore:
             query: Search query text
             k: Number of results to return (default: TOP_K_CHUNKS)
 
+        Returns:
+            List of chunks with similarity scores
+        """
+        print(f"Searching for: {query[:50]}...")
+
+        # Serve repeated queries from the LRU result cache
+        cache_key = (query, k, self._index_version)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            self._search_cache.move_to_end(cache_key)
+            return [chunk.copy() for chunk in cached]
+
+        # Encode query
+        query_embedding = self.embed_query(query)
+
+        results = self.search_with_embedding(query_embedding, k=k)
+
+        self._search_cache[cache_key] = [chunk.copy() for chunk in results]
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+
+        return results
+
+    def search_with_embedding(self, query_embedding: np.ndarray, k: int = None) -> List[Dict]:
+        """
+        Search for similar chunks using a precomputed query embedding
+
+        Args:
+            query_embedding: Query embedding from embed_query()
+            k: Number of results to return (default: TOP_K_CHUNKS)
+
         Returns:
             List of chunks with similarity scores
         """
@@ -134,28 +425,136 @@ class VectorStore:
         if self.index is None:
             raise ValueError("Index not loaded. Call load_index() first.")
 
-        print(f"Searching for: {query[:50]}...")
+        # Apply nprobe for IVF-type indices (no-op for flat indices)
+        if hasattr(self.index, 'nprobe'):
+            self.index.nprobe = NPROBE
 
-        # Encode query
-        query_embedding = self.embedding_model.encode([query])
+        # Normalize a copy so the inner product is cosine similarity
+        query_embedding = np.array(query_embedding, dtype='float32', copy=True)
+        faiss.normalize_L2(query_embedding)
 
-        # Search in FAISS
-        distances, indices = self.index.search(query_embedding.astype('float32'), k)
+        # Search in FAISS (scores are cosine similarities, higher is better)
+        scores, indices = self.index.search(query_embedding, k)
 
-        # Prepare results
-        results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx < len(self.chunks_metadata):
-                chunk = self.chunks_metadata[idx].copy()
-                # Convert L2 distance to similarity score (inverse)
-                chunk['distance'] = float(distance)
-                chunk['similarity'] = 1 / (1 + float(distance))
-                chunk['rank'] = i + 1
-                results.append(chunk)
+        # Prepare results in one pass (dict-merge instead of copy + mutate)
+        n_chunks = len(self.chunks_metadata)
+        results = [
+            {**self.chunks_metadata[idx],
+             'similarity': float(score), 'rank': rank, 'chunk_idx': int(idx)}
+            for rank, (score, idx) in enumerate(zip(scores[0], indices[0]), 1)
+            if idx < n_chunks
+        ]
 
         print(f"Found {len(results)} results")
         return results
 
+    def search_threshold(self, query: str, threshold: float, k: int = None) -> List[Dict]:
+        """
+        Retrieve all chunks above a similarity threshold
+
+        Uses FAISS range_search so the index can stop at the similarity
+        bound instead of over-fetching a fixed top-k. Falls back to plain
+        top-k search when fewer than FINAL_CHUNKS hits clear the threshold
+        or the index type does not support range queries.
+
+        Args:
+            query: Search query text
+            threshold: Minimum cosine similarity to include a chunk
+            k: Fallback top-k size (default: TOP_K_CHUNKS)
+
+        Returns:
+            List of chunks with similarity scores, highest first
+        """
+        if k is None:
+            k = TOP_K_CHUNKS
+
+        if self.index is None:
+            raise ValueError("Index not loaded. Call load_index() first.")
+
+        query_embedding = self.embed_query(query)
+
+        # Normalize a copy so the inner product is cosine similarity
+        normalized = np.array(query_embedding, dtype='float32', copy=True)
+        faiss.normalize_L2(normalized)
+
+        if hasattr(self.index, 'nprobe'):
+            self.index.nprobe = NPROBE
+
+        try:
+            lims, scores, indices = self.index.range_search(normalized, threshold)
+        except RuntimeError as e:
+            print(f"[WARNING] range_search unsupported ({e}), falling back to top-k")
+            return self.search_with_embedding(query_embedding, k=k)
+
+        hits = sorted(
+            zip(scores[lims[0]:lims[1]], indices[lims[0]:lims[1]]),
+            reverse=True
+        )
+
+        if len(hits) < FINAL_CHUNKS:
+            # Too few in-radius hits to fill the final answer context
+            return self.search_with_embedding(query_embedding, k=k)
+
+        n_chunks = len(self.chunks_metadata)
+        return [
+            {**self.chunks_metadata[idx],
+             'similarity': float(score), 'rank': rank, 'chunk_idx': int(idx)}
+            for rank, (score, idx) in enumerate(hits, 1)
+            if idx < n_chunks
+        ]
+
+    def search_batch(self, queries: List[str], k: int = None) -> List[List[Dict]]:
+        """
+        Search for similar chunks for multiple queries at once
+
+        Encodes all queries in one model call and searches FAISS with the
+        full query matrix in a single BLAS pass, amortizing the per-call
+        transformer and index overhead across the batch.
+
+        Args:
+            queries: List of search query texts
+            k: Number of results per query (default: TOP_K_CHUNKS)
+
+        Returns:
+            List of result lists, one per query (same order as queries)
+        """
+        if k is None:
+            k = TOP_K_CHUNKS
+
+        if self.index is None:
+            raise ValueError("Index not loaded. Call load_index() first.")
+
+        if not queries:
+            return []
+
+        print(f"Batch searching {len(queries)} queries...")
+
+        # Encode all queries in one call
+        query_embeddings = self.embedding_model.encode(
+            queries, batch_size=32, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+        faiss.normalize_L2(query_embeddings)
+
+        # Apply nprobe for IVF-type indices (no-op for flat indices)
+        if hasattr(self.index, 'nprobe'):
+            self.index.nprobe = NPROBE
+
+        # One FAISS call for the whole query matrix
+        scores, indices = self.index.search(query_embeddings, k)
+
+        n_chunks = len(self.chunks_metadata)
+        all_results = [
+            [
+                {**self.chunks_metadata[idx],
+                 'similarity': float(score), 'rank': rank, 'chunk_idx': int(idx)}
+                for rank, (score, idx) in enumerate(zip(scores[query_idx], indices[query_idx]), 1)
+                if idx < n_chunks
+            ]
+            for query_idx in range(len(queries))
+        ]
+
+        return all_results
+
     def filter_and_deduplicate(self, results: List[Dict], final_k: int = None) -> List[Dict]:
         """
         Filter and deduplicate search results
@@ -173,24 +572,28 @@ class VectorStore:
         # Sort by similarity (higher is better)
         sorted_results = sorted(results, key=lambda x: x['similarity'], reverse=True)
 
-        # Deduplicate by text similarity
+        # Deduplicate by SimHash signature (near-duplicate texts end up
+        # within a small Hamming distance of each other)
         filtered = []
-        seen_texts = set()
+        seen_signatures = []
 
         for result in sorted_results:
             text_normalized = result['text'].strip().lower()
 
+            signature = result.get('_simhash')
+            if signature is None:
+                signature = self._simhash(text_normalized)
+                result['_simhash'] = signature
+
             # Check if we've seen very similar text
-            is_duplicate = False
-            for seen in seen_texts:
-                # Simple character overlap check
-                if self._text_overlap(text_normalized, seen) > 0.9:
-                    is_duplicate = True
-                    break
+            is_duplicate = any(
+                bin(signature ^ seen).count('1') < 6
+                for seen in seen_signatures
+            )
 
             if not is_duplicate:
                 filtered.append(result)
-                seen_texts.add(text_normalized)
+                seen_signatures.append(signature)
 
                 if len(filtered) >= final_k:
                     break
@@ -198,19 +601,26 @@ class VectorStore:
         print(f"Filtered to {len(filtered)} unique chunks")
         return filtered
 
-    def _text_overlap(self, text1: str, text2: str) -> float:
-        """Calculate text overlap ratio"""
-        if not text1 or not text2:
-            return 0.0
+    def _simhash(self, text: str) -> int:
+        """
+        64-bit SimHash of a text over its character 3-grams
 
-        # Simple character-based overlap
-        set1 = set(text1)
-        set2 = set(text2)
+        Near-duplicate texts produce signatures within a small Hamming
+        distance, so dedup becomes cheap integer XORs instead of pairwise
+        character-set comparisons.
+        """
+        import hashlib
 
-        intersection = len(set1 & set2)
-        union = len(set1 | set2)
+        counts = [0] * 64
+        for i in range(max(len(text) - 2, 1)):
+            gram = text[i:i+3]
+            h = int.from_bytes(
+                hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big'
+            )
+            for bit in range(64):
+                counts[bit] += 1 if (h >> bit) & 1 else -1
 
-        return intersection / union if union > 0 else 0.0
+        return sum(1 << bit for bit in range(64) if counts[bit] > 0)
 
     def add_faq_to_index(self, question: str, answer: str, faq_id: str = None):
         """
@@ -227,22 +637,43 @@ class VectorStore:
         # Combine question and answer for better semantic matching
         combined_text = f"質問: {question}\n回答: {answer}"
 
-        # Vectorize the FAQ
-        embedding = self.embedding_model.encode([combined_text])
+        # Vectorize the FAQ (normalized to match the inner-product index)
+        embedding = self.embedding_model.encode(
+            [combined_text], convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+        faiss.normalize_L2(embedding)
 
         # Add to FAISS index
-        self.index.add(embedding.astype('float32'))
+        self.index.add(embedding)
 
         # Add metadata
         faq_metadata = {
             'text': combined_text,
+            '_text_lower': combined_text.lower(),
             'question': question,
             'answer': answer,
             'source': 'FAQ',
             'type': 'faq',
             'faq_id': faq_id
         }
+        chunk_idx = len(self.chunks_metadata)
         self.chunks_metadata.append(faq_metadata)
+        self._index_version += 1
+
+        # Update the n-gram postings incrementally instead of invalidating them
+        if self._ngram_postings is not None:
+            text = faq_metadata['_text_lower']
+            seen = set()
+            for n in (2, 3):
+                for i in range(len(text) - n + 1):
+                    seen.add(text[i:i+n])
+            for gram in seen:
+                existing = self._ngram_postings.get(gram)
+                if existing is None:
+                    self._ngram_postings[gram] = np.array([chunk_idx], dtype=np.int64)
+                else:
+                    self._ngram_postings[gram] = np.append(existing, chunk_idx)
+            self._postings_version = self._index_version
 
         print(f"[OK] Added FAQ to index: {question[:50]}...")
 
@@ -250,12 +681,27 @@ class VectorStore:
         """
         Rebuild the entire index including all FAQs
 
+        Holds an exclusive file lock on the index path for the duration,
+        so only one process rewrites the (memory-mapped, shared) index
+        file at a time under multi-worker deployments.
+
         Args:
             faq_list: List of FAQ dicts with 'question' and 'answer' keys
         """
         if self.index is None:
             raise ValueError("Index not loaded. Call load_index() first.")
 
+        lock_path = VECTOR_DB_PATH + '.lock'
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._rebuild_with_faqs_locked(faq_list)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rebuild_with_faqs_locked(self, faq_list: List[Dict]):
+        """Rebuild the index; caller must hold the index file lock"""
         print(f"\n[INFO] Rebuilding index with {len(faq_list)} FAQs...")
 
         # Get existing PDF chunks (non-FAQ)
@@ -277,6 +723,7 @@ class VectorStore:
 
             faq_metadata = {
                 'text': combined_text,
+                '_text_lower': combined_text.lower(),
                 'question': faq['question'],
                 'answer': faq['answer'],
                 'source': 'FAQ',
@@ -287,17 +734,47 @@ class VectorStore:
 
         print(f"[INFO] Total chunks (PDF + FAQ): {len(all_chunks)}")
 
-        # Vectorize all texts
-        print(f"[INFO] Vectorizing {len(all_texts)} texts...")
-        embeddings = self.embedding_model.encode(all_texts, show_progress_bar=True)
-
-        # Recreate index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings.astype('float32'))
+        # Vectorize in batches to cap peak memory: the new index is built
+        # alongside the old one and swapped in atomically at the end
+        n_texts = len(all_texts)
+        batch_size = 256
+        print(f"[INFO] Vectorizing {n_texts} texts in batches of {batch_size}...")
+
+        new_index = None
+        buffered = []  # batches held until the index exists (training sample)
+        buffered_count = 0
+
+        for start in range(0, n_texts, batch_size):
+            batch = all_texts[start:start + batch_size]
+            embs = self.embedding_model.encode(
+                batch, convert_to_numpy=True
+            ).astype(np.float32, copy=False)
+            faiss.normalize_L2(embs)
+
+            if new_index is not None:
+                new_index.add(embs)
+                continue
+
+            buffered.append(embs)
+            buffered_count += len(embs)
+
+            # Small corpora need no training; large ones train once enough
+            # vectors are buffered (or the corpus is exhausted)
+            needs_training = n_texts >= IVFPQ_MIN_VECTORS
+            if (not needs_training
+                    or buffered_count >= IVFPQ_MIN_VECTORS
+                    or start + batch_size >= n_texts):
+                training_sample = np.vstack(buffered)
+                new_index = self._build_index(training_sample, n_total=n_texts)
+                new_index.add(training_sample)
+                buffered = []
+
+        # Atomic swap; the old index is freed once no caller references it
+        self.index = new_index
 
         # Update metadata
         self.chunks_metadata = all_chunks
+        self._index_version += 1
 
         print(f"[OK] Index rebuilt successfully")
         print(f"[OK] Total vectors in index: {self.index.ntotal}")
@@ -306,6 +783,127 @@ class VectorStore:
         self.save_index()
         print(f"[OK] Updated index saved")
 
+    def _ensure_ngram_postings(self):
+        """
+        Build the 2/3-gram inverted index over chunk texts if stale
+
+        Maps each character n-gram to a numpy array of chunk indices so
+        keyword_search can score candidates with array ops instead of
+        scanning every chunk per keyword.
+        """
+        if self._ngram_postings is not None and self._postings_version == self._index_version:
+            return
+
+        print(f"[INFO] Building n-gram postings for {len(self.chunks_metadata)} chunks...")
+        postings = {}
+        for idx, chunk in enumerate(self.chunks_metadata):
+            text = chunk.get('_text_lower')
+            if text is None:
+                text = chunk['text'].lower()
+                chunk['_text_lower'] = text
+            seen = set()
+            for n in (2, 3):
+                for i in range(len(text) - n + 1):
+                    seen.add(text[i:i+n])
+            for gram in seen:
+                postings.setdefault(gram, []).append(idx)
+
+        self._ngram_postings = {
+            gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()
+        }
+        self._postings_version = self._index_version
+
+    def _keyword_candidates(self, keyword: str) -> np.ndarray:
+        """
+        Chunk indices whose text contains the keyword
+
+        Keywords up to 3 chars are direct postings lookups; longer ones
+        intersect the postings of their 3-grams and verify the few
+        survivors with a substring check.
+        """
+        if len(keyword) <= 3:
+            return self._ngram_postings.get(keyword, np.empty(0, dtype=np.int64))
+
+        candidates = None
+        for i in range(len(keyword) - 2):
+            gram_ids = self._ngram_postings.get(keyword[i:i+3])
+            if gram_ids is None:
+                return np.empty(0, dtype=np.int64)
+            candidates = gram_ids if candidates is None else np.intersect1d(
+                candidates, gram_ids, assume_unique=True
+            )
+            if candidates.size == 0:
+                return candidates
+
+        # Verify the remaining candidates with the exact substring test
+        metadata = self.chunks_metadata
+        verified = [
+            idx for idx in candidates
+            if keyword in (metadata[idx].get('_text_lower') or metadata[idx]['text'].lower())
+        ]
+        return np.array(verified, dtype=np.int64)
+
+    def _get_mecab(self):
+        """MeCab tagger if fugashi (and a dictionary) is installed, else None"""
+        if fugashi is None:
+            return None
+        if self._mecab is None:
+            try:
+                self._mecab = fugashi.Tagger()
+            except Exception as e:
+                print(f"[WARNING] MeCab unavailable ({e}), using n-gram keywords")
+                self._mecab = False  # Don't retry on every query
+        return self._mecab or None
+
+    def _match_keywords(self, keywords: List[str]) -> List[Tuple[str, np.ndarray]]:
+        """
+        Map each keyword to the chunk indices whose text contains it
+
+        With pyahocorasick installed, all keywords are compiled into one
+        automaton and each candidate chunk is scanned a single time for
+        every pattern. Otherwise each keyword resolves through the n-gram
+        postings individually.
+
+        Returns:
+            List of (keyword, array of matching chunk indices) pairs,
+            keywords with no matches omitted
+        """
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for kw in set(keywords):
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+
+            # Candidate chunks: union of postings for each keyword's leading 2-gram
+            arrays = [
+                self._ngram_postings.get(kw[:2]) for kw in set(keywords)
+            ]
+            arrays = [a for a in arrays if a is not None and a.size]
+            if not arrays:
+                return []
+            candidates = np.unique(np.concatenate(arrays))
+
+            hits = {}
+            for idx in candidates:
+                idx = int(idx)
+                chunk = self.chunks_metadata[idx]
+                text = chunk.get('_text_lower') or chunk['text'].lower()
+                for _, kw in automaton.iter(text):
+                    hits.setdefault(kw, set()).add(idx)
+
+            return [
+                (kw, np.array(sorted(ids), dtype=np.int64))
+                for kw, ids in hits.items()
+            ]
+
+        # Fallback: per-keyword postings lookups / intersections
+        matches = []
+        for kw in keywords:
+            candidates = self._keyword_candidates(kw)
+            if candidates.size:
+                matches.append((kw, candidates))
+        return matches
+
     def keyword_search(self, query: str, k: int = None) -> List[Dict]:
         """
         Keyword-based search through all chunks (improved for Japanese)
@@ -336,17 +934,26 @@ class VectorStore:
         alphanumeric = re.findall(r'[A-Za-z0-9\-]+', query)
         keywords.extend([w for w in alphanumeric if len(w) > 1])
 
-        # Extract common Japanese patterns (2-4 character sequences)
-        japanese_chars = re.findall(r'[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\u4e00-\u9faf]+', query)
-        for word in japanese_chars:
-            if len(word) >= 2:
-                keywords.append(word)
-                # Also add 2-3 character substrings for partial matching
-                for i in range(len(word) - 1):
-                    if i + 2 <= len(word):
-                        keywords.append(word[i:i+2])
-                    if i + 3 <= len(word):
-                        keywords.append(word[i:i+3])
+        # Extract Japanese keywords: morphological tokens when MeCab is
+        # available (far fewer, more meaningful terms), otherwise the
+        # sliding-window 2-3 gram fallback
+        tagger = self._get_mecab()
+        if tagger is not None:
+            for token in tagger(query):
+                if token.feature.pos1 in ('\u540d\u8a5e', '\u52d5\u8a5e', '\u5f62\u5bb9\u8a5e') and len(token.surface) >= 2:
+                    keywords.append(token.surface)
+        else:
+            # Extract common Japanese patterns (2-4 character sequences)
+            japanese_chars = re.findall(r'[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\u4e00-\u9faf]+', query)
+            for word in japanese_chars:
+                if len(word) >= 2:
+                    keywords.append(word)
+                    # Also add 2-3 character substrings for partial matching
+                    for i in range(len(word) - 1):
+                        if i + 2 <= len(word):
+                            keywords.append(word[i:i+2])
+                        if i + 3 <= len(word):
+                            keywords.append(word[i:i+3])
 
         # Remove duplicates and convert to lowercase
         keywords = list(set([kw.lower() for kw in keywords if len(kw) >= 2]))
@@ -354,32 +961,39 @@ class VectorStore:
         if not keywords:
             return []
 
+        self._ensure_ngram_postings()
+
+        # Accumulate per-chunk scores with array ops over the matches
+        scores = np.zeros(len(self.chunks_metadata), dtype=np.float64)
+        keyword_hits = []  # (keyword, set of matching chunk indices)
+
+        for kw, candidates in self._match_keywords(keywords):
+            # Longer keywords get higher scores
+            weight = len(kw) / 10.0  # Normalize by length
+            scores[candidates] += weight
+            keyword_hits.append((kw, set(candidates.tolist())))
+
+        matched_indices = np.nonzero(scores > 0)[0]
+        if matched_indices.size == 0:
+            return []
+
+        # Sort by capped keyword score (stable, highest first) and take top-k
+        capped = np.minimum(scores[matched_indices], 1.0)  # Cap at 1.0
+        order = np.argsort(-capped, kind='stable')[:k]
+        top_indices = matched_indices[order]
+
         results = []
-        for idx, chunk in enumerate(self.chunks_metadata):
-            text_lower = chunk['text'].lower()
-
-            # Count keyword matches with scoring
-            match_score = 0
-            matched_keywords = []
-            for kw in keywords:
-                if kw in text_lower:
-                    # Longer keywords get higher scores
-                    weight = len(kw) / 10.0  # Normalize by length
-                    match_score += weight
-                    matched_keywords.append(kw)
-
-            if match_score > 0:
-                chunk_copy = chunk.copy()
-                chunk_copy['keyword_score'] = min(match_score, 1.0)  # Cap at 1.0
-                chunk_copy['keyword_matches'] = len(matched_keywords)
-                chunk_copy['matched_keywords'] = matched_keywords
-                chunk_copy['chunk_idx'] = idx
-                results.append(chunk_copy)
-
-        # Sort by keyword score
-        results = sorted(results, key=lambda x: x['keyword_score'], reverse=True)
-
-        return results[:k]
+        for idx in top_indices:
+            idx = int(idx)
+            matched_keywords = [kw for kw, hits in keyword_hits if idx in hits]
+            chunk_copy = self.chunks_metadata[idx].copy()
+            chunk_copy['keyword_score'] = min(float(scores[idx]), 1.0)
+            chunk_copy['keyword_matches'] = len(matched_keywords)
+            chunk_copy['matched_keywords'] = matched_keywords
+            chunk_copy['chunk_idx'] = idx
+            results.append(chunk_copy)
+
+        return results
 
     def hybrid_search(self, query: str, k: int = None, alpha: float = 0.5) -> List[Dict]:
         """
@@ -391,6 +1005,27 @@ class VectorStore:
             alpha: Weight for vector search (1-alpha for keyword search)
                    0.0 = keyword only, 1.0 = vector only, 0.5 = equal weight
 
+        Returns:
+            List of chunks with combined scores
+        """
+        # Encode the query once and delegate
+        query_embedding = self.embed_query(query)
+        return self.hybrid_search_with_embedding(query_embedding, query, k=k, alpha=alpha)
+
+    def hybrid_search_with_embedding(self, query_embedding: np.ndarray, query: str,
+                                     k: int = None, alpha: float = 0.5) -> List[Dict]:
+        """
+        Hybrid search using a precomputed query embedding
+
+        Avoids re-encoding when the caller already embedded the query
+        (e.g. rag_system encodes the expanded query once per request).
+
+        Args:
+            query_embedding: Query embedding from embed_query()
+            query: Raw query text (used for keyword search)
+            k: Number of results to return
+            alpha: Weight for vector search (1-alpha for keyword search)
+
         Returns:
             List of chunks with combined scores
         """
@@ -399,65 +1034,55 @@ class VectorStore:
 
         print(f"Hybrid search: query='{query[:50]}...', k={k}, alpha={alpha}")
 
-        # Get vector search results
-        vector_results = self.search(query, k=k*2)  # Get more candidates
-
-        # Get keyword search results
-        keyword_results = self.keyword_search(query, k=k*2)
-
-        # Create a mapping of chunk index to scores
+        # Run vector and keyword search concurrently
+        # Both are independent and release the GIL (FAISS in C++, numpy in C)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            vector_future = executor.submit(self.search_with_embedding, query_embedding, k*2)  # Get more candidates
+            keyword_future = executor.submit(self.keyword_search, query, k*2)
+            vector_results = vector_future.result()
+            keyword_results = keyword_future.result()
+
+        # Fuse with Reciprocal Rank Fusion: scale-free, so the cosine and
+        # keyword score distributions never need normalizing against each
+        # other. alpha still weights the two rankings against each other.
         score_map = {}
 
-        # Add vector scores
-        for result in vector_results:
-            # Find the chunk index
-            chunk_idx = None
-            for idx, chunk in enumerate(self.chunks_metadata):
-                if chunk['text'] == result['text']:
-                    chunk_idx = idx
-                    break
+        # Add vector ranking (keyed on the FAISS id recorded by search)
+        for rank, result in enumerate(vector_results, 1):
+            chunk_idx = result.get('chunk_idx')
 
             if chunk_idx is not None:
                 if chunk_idx not in score_map:
-                    score_map[chunk_idx] = {'chunk': result, 'vector_score': 0, 'keyword_score': 0}
+                    score_map[chunk_idx] = {'chunk': result, 'vector_score': 0, 'keyword_score': 0, 'rrf': 0.0}
                 score_map[chunk_idx]['vector_score'] = result['similarity']
                 score_map[chunk_idx]['chunk'] = result
+                score_map[chunk_idx]['rrf'] += alpha / (RRF_K + rank)
 
-        # Add keyword scores
-        for result in keyword_results:
+        # Add keyword ranking
+        for rank, result in enumerate(keyword_results, 1):
             chunk_idx = result.get('chunk_idx')
             if chunk_idx is not None:
                 if chunk_idx not in score_map:
                     # Need to get the full chunk
                     chunk = self.chunks_metadata[chunk_idx].copy()
-                    score_map[chunk_idx] = {'chunk': chunk, 'vector_score': 0, 'keyword_score': 0}
+                    score_map[chunk_idx] = {'chunk': chunk, 'vector_score': 0, 'keyword_score': 0, 'rrf': 0.0}
                 score_map[chunk_idx]['keyword_score'] = result['keyword_score']
+                score_map[chunk_idx]['rrf'] += (1 - alpha) / (RRF_K + rank)
 
-        # Combine scores
+        # Attach scores to result chunks
         combined_results = []
         for chunk_idx, scores in score_map.items():
             chunk = scores['chunk'].copy()
-
-            # Normalize and combine scores
-            vector_score = scores['vector_score']
-            keyword_score = scores['keyword_score']
-
-            # Combined score using weighted average
-            combined_score = alpha * vector_score + (1 - alpha) * keyword_score
-
-            chunk['vector_score'] = vector_score
-            chunk['keyword_score'] = keyword_score
-            chunk['combined_score'] = combined_score
-            chunk['similarity'] = combined_score  # Use combined score as similarity
-
+            chunk['vector_score'] = scores['vector_score']
+            chunk['keyword_score'] = scores['keyword_score']
+            chunk['combined_score'] = scores['rrf']
+            chunk['similarity'] = scores['rrf']  # Use combined score as similarity
             combined_results.append(chunk)
 
-        # Sort by combined score
-        combined_results = sorted(combined_results, key=lambda x: x['combined_score'], reverse=True)
-
         print(f"Hybrid search found {len(combined_results)} results (vector: {len(vector_results)}, keyword: {len(keyword_results)})")
 
-        return combined_results[:k]
+        # Top-k without fully sorting the candidate pool
+        return heapq.nlargest(k, combined_results, key=lambda x: x['combined_score'])
 
 
 def main():
@@ -1,15 +1,75 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response, send_file, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+import atexit
 import json
+import concurrent.futures
+import contextlib
+import csv
 import datetime
+import gzip
+import io
+import logging
+import logging.handlers
+import re
+import shutil
+import tempfile
 import time
+import traceback
+import uuid
+import zipfile
 import os
+import queue
 import sys
 import threading
+from collections import OrderedDict
+
+import numpy as np
 from dotenv import load_dotenv
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
+# Claude APIキーは起動時に一度だけ読む（リクエストごとにenvironを引かない）
+_CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
+_HAS_CLAUDE_API = bool(_CLAUDE_API_KEY)
+
+# ログ設定（LOG_LEVEL環境変数で調整、デフォルトはINFO）
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    format='[%(levelname)s] %(message)s'
+)
+
+# ログ出力は専用スレッド経由にする:
+# 呼び出し側（進捗コールバックやリクエストハンドラ）はキューに積むだけで、
+# stdoutへの書き込みはQueueListenerのスレッドがまとめて行う
+_log_queue = queue.Queue(-1)
+_root_logger = logging.getLogger()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, *_root_logger.handlers, respect_handler_level=True
+)
+_root_logger.handlers = [logging.handlers.QueueHandler(_log_queue)]
+
+# gunicornの--preloadではこのモジュールはマスタープロセスでimportされ、
+# import時に起動したスレッドはfork後のワーカーに引き継がれない。
+# リスナーはログを出すプロセス側で初回に起動する（PIDで判定）
+_log_listener_pid = None
+_log_listener_lock = threading.Lock()
+
+
+def _ensure_log_listener():
+    """QueueListenerのドレインスレッドを現在のプロセスで起動する"""
+    global _log_listener_pid
+    pid = os.getpid()
+    if _log_listener_pid == pid:
+        return
+    with _log_listener_lock:
+        if _log_listener_pid != pid:
+            _log_listener.start()
+            _log_listener_pid = pid
+
+
+logger = logging.getLogger(__name__)
+
 # FAQ system のパスを追加
 # FAQ system is now in the same directory
 from faq_system import FAQSystem, find_similar_faqs
@@ -19,23 +79,274 @@ from hybrid_rag_system import HybridRAGSystem
 
 app = Flask(__name__)
 
+# JSONレスポンスの軽量化:
+# - キーのソートを省く（進捗ポーリングのdictは毎秒シリアライズされる）
+# - 日本語をASCIIエスケープせずUTF-8のまま返す（エンコード処理とペイロードの両方を削減）
+# - デバッグ起動でも整形出力せずコンパクトなセパレータで返す
+app.json.sort_keys = False
+app.json.ensure_ascii = False
+app.json.compact = True
+
+# アップロードサイズ上限（PDFアップロードの10MB制限）。
+# Werkzeugが受信時点で弾くため、ハンドラ内でボディ全体を読む必要がない
+app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def _handle_too_large(e):
+    """サイズ超過時も従来のJSONエラーメッセージを返す"""
+    return jsonify({'success': False, 'message': 'ファイルサイズが10MBを超えています'}), 413
+
+# テキスト系レスポンスのgzip圧縮（管理画面HTMLやCSVエクスポートは日本語込みで数百KBになる）
+GZIP_MIN_SIZE = int(os.getenv('GZIP_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '4'))  # レベル4はほぼ最大圧縮で、CPUコストは数分の一
+_GZIP_MIMETYPES = ('text/html', 'text/csv', 'application/json')
+
+
+@app.before_request
+def _start_log_listener():
+    """fork後のワーカープロセスでログのドレインスレッドを確実に動かす"""
+    _ensure_log_listener()
+
+
+@app.after_request
+def _gzip_response(response):
+    """クライアントが対応していればテキスト系レスポンスをgzip圧縮する"""
+    if ('gzip' not in request.headers.get('Accept-Encoding', '')
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.status_code != 200
+            or response.mimetype not in _GZIP_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # 既存のFAQシステム（管理画面用に保持）
 faq_system_dir = os.path.dirname(__file__)
 faq_data_path = os.path.join(faq_system_dir, 'faq_database.csv')  # 承認済みFAQ
 faq_system = FAQSystem(faq_data_path)
-faq_system.claude_api_key = os.getenv('CLAUDE_API_KEY')
+faq_system.claude_api_key = _CLAUDE_API_KEY
 # FAQSystemの作業ディレクトリを明示的に設定
 faq_system.pending_file = os.path.join(faq_system_dir, 'pending_qa.csv')
 faq_system.unsatisfied_qa_file = os.path.join(faq_system_dir, 'unsatisfied_qa.csv')
 
-# ハイブリッドRAGシステムを初期化（検索用）
-print("[INFO] ハイブリッドRAGシステムを初期化中...")
-hybrid_rag = HybridRAGSystem(
-    faq_csv_path='faq_database.csv',  # 承認済みFAQ
-    faq_threshold=0.85,
-    claude_api_key=os.getenv('CLAUDE_API_KEY')
-)
-print("[INFO] ハイブリッドRAGシステム初期化完了")
+# ハイブリッドRAGシステム（検索用）は遅延初期化のシングルトンにする:
+# エンベディングモデルのロードとインデックス構築で起動が数秒ブロックするため、
+# importではなく最初に必要になったリクエストで構築する。
+# gunicornで複数workerを使う場合は `--preload` を付ければマスターで
+# 最初の構築を済ませてCOWで共有できる（Procfile参照）
+_hybrid_rag = None
+_hybrid_rag_lock = threading.Lock()
+
+
+def get_hybrid_rag():
+    """HybridRAGSystemを必要になった時点で一度だけ構築して返す"""
+    global _hybrid_rag
+    if _hybrid_rag is None:
+        with _hybrid_rag_lock:
+            if _hybrid_rag is None:
+                logger.info("ハイブリッドRAGシステムを初期化中...")
+                _hybrid_rag = HybridRAGSystem(
+                    faq_csv_path='faq_database.csv',  # 承認済みFAQ
+                    faq_threshold=0.85,
+                    claude_api_key=_CLAUDE_API_KEY
+                )
+                logger.info("ハイブリッドRAGシステム初期化完了")
+    return _hybrid_rag
+
+# window_info文字列（例: "ウィンドウ3 (位置: 1500)"）から位置を抜き出す正規表現
+# リクエストごとにre.compileが走らないようモジュールレベルで一度だけコンパイルする
+_POSITION_RE = re.compile(r'位置:\s*(\d+)')
+
+# /search用セマンティックキャッシュ（言い換えられた同趣旨の質問をLLM呼び出しなしで返す）
+# エントリ同士を類似度リンクでつないだグラフ構造にし、近傍リンクで裏付けられた候補は
+# 少し緩いしきい値でもヒットとみなす（パラフレーズのクラスタに推移的に届く）
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '256'))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9'))
+SEMANTIC_CACHE_LINK_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_LINK_THRESHOLD', '0.8'))
+SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', str(24 * 3600)))  # 秒
+
+# 質問 -> {'emb': 正規化済み埋め込み, 'body': シリアライズ済みJSONバイト列, 'ts': 保存時刻,
+#          'neighbors': {隣接質問: リンク重み}}
+_semantic_cache = OrderedDict()
+_semantic_cache_lock = threading.Lock()
+
+_SEARCH_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def _serialize_search_payload(payload):
+    """検索レスポンスを一度だけJSONバイト列にする（キャッシュヒット時は再シリアライズしない）"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _normalize_embedding(embedding):
+    """埋め込みをL2正規化する（コサイン類似度を内積1回で計算できるようにする）"""
+    return embedding / (np.linalg.norm(embedding) + 1e-9)
+
+
+def _semantic_cache_remove_locked(question):
+    """エントリを削除し、他エントリからの逆リンクも掃除する（ロック保持前提）"""
+    entry = _semantic_cache.pop(question, None)
+    if entry is not None:
+        for other in entry['neighbors']:
+            other_entry = _semantic_cache.get(other)
+            if other_entry is not None:
+                other_entry['neighbors'].pop(question, None)
+
+
+def _semantic_cache_lookup(query_embedding):
+    """キャッシュ済み質問から類似質問を探す（直接ヒット→グラフ経由の推移的ヒットの順）"""
+    now = time.time()
+    with _semantic_cache_lock:
+        # 期限切れエントリを掃除
+        expired = [q for q, entry in _semantic_cache.items()
+                   if now - entry['ts'] > SEMANTIC_CACHE_TTL]
+        for q in expired:
+            _semantic_cache_remove_locked(q)
+
+        if not _semantic_cache:
+            return None
+
+        questions = list(_semantic_cache.keys())
+        embeddings = np.vstack([_semantic_cache[q]['emb'] for q in questions])
+
+    # 保存時に正規化済みなのでコサイン類似度は内積そのもの
+    similarities = embeddings @ _normalize_embedding(query_embedding)
+    best_idx = int(np.argmax(similarities))
+
+    if similarities[best_idx] >= SEMANTIC_CACHE_THRESHOLD:
+        with _semantic_cache_lock:
+            entry = _semantic_cache.get(questions[best_idx])
+            if entry is not None:
+                # ヒットしたエントリはLRU順の末尾へ（参照順で追い出す）
+                _semantic_cache.move_to_end(questions[best_idx])
+        return entry['body'] if entry is not None else None
+
+    # 推移的ヒット: しきい値未満でも、近傍リンクの強い候補は
+    # 経路スコア（クエリ類似度 × リンク重み）で採用する
+    transitive_floor = SEMANTIC_CACHE_THRESHOLD * SEMANTIC_CACHE_LINK_THRESHOLD
+    best_body = None
+    best_question = None
+    best_score = transitive_floor
+    with _semantic_cache_lock:
+        for question, similarity in zip(questions, similarities):
+            if similarity < SEMANTIC_CACHE_LINK_THRESHOLD:
+                continue
+            entry = _semantic_cache.get(question)
+            if entry is None or not entry['neighbors']:
+                continue
+            path_score = float(similarity) * max(entry['neighbors'].values())
+            if path_score >= best_score:
+                best_score = path_score
+                best_body = entry['body']
+                best_question = question
+        if best_question is not None:
+            _semantic_cache.move_to_end(best_question)
+    return best_body
+
+
+def _semantic_cache_store(question, query_embedding, body):
+    """回答をキャッシュに保存し、類似エントリと相互リンクを張る（LRUで上限管理）"""
+    embedding = _normalize_embedding(query_embedding)
+    with _semantic_cache_lock:
+        # 既存エントリとの類似度上位3件をリンク（しきい値未満はつながない）
+        neighbors = {}
+        if _semantic_cache:
+            existing = list(_semantic_cache.keys())
+            sims = np.vstack([_semantic_cache[q]['emb'] for q in existing]) @ embedding
+            for idx in np.argsort(sims)[::-1][:3]:
+                weight = float(sims[idx])
+                if weight < SEMANTIC_CACHE_LINK_THRESHOLD:
+                    break
+                other = existing[int(idx)]
+                neighbors[other] = weight
+                _semantic_cache[other]['neighbors'][question] = weight
+
+        _semantic_cache[question] = {
+            'emb': embedding, 'body': body,
+            'ts': time.time(), 'neighbors': neighbors
+        }
+        _semantic_cache.move_to_end(question)
+        while len(_semantic_cache) > SEMANTIC_CACHE_SIZE:
+            _semantic_cache_remove_locked(next(iter(_semantic_cache)))
+
+
+def clear_semantic_cache():
+    """FAQデータが変わったときにキャッシュを無効化"""
+    with _semantic_cache_lock:
+        _semantic_cache.clear()
+
+
+# auto_improve_qa のメモ化キャッシュ
+# 同一・類似の不満報告でClaude API呼び出しを繰り返さないようにする
+IMPROVE_CACHE_SIZE = int(os.environ.get('IMPROVE_CACHE_SIZE', '256'))
+IMPROVE_CACHE_THRESHOLD = float(os.environ.get('IMPROVE_CACHE_THRESHOLD', '0.85'))
+IMPROVE_CACHE_TTL = int(os.environ.get('IMPROVE_CACHE_TTL', str(24 * 3600)))  # 秒
+
+# (正規化済みユーザー質問, 正規化済みマッチ質問) -> {'emb', 'result', 'ts'}
+_improve_cache = OrderedDict()
+_improve_cache_lock = threading.Lock()
+
+
+def _normalize_feedback_text(text):
+    """フィードバック文字列をキャッシュキー用に正規化する"""
+    return ' '.join((text or '').strip().lower().split())
+
+
+def improve_qa_cached(user_question, matched_question, matched_answer, timestamp=None):
+    """auto_improve_qa をメモ化して呼び出す
+
+    同じ（または類似の）不満報告が短時間に繰り返された場合は
+    前回の結果を返し、Claude APIの往復を省略する。
+    """
+    uq_norm = _normalize_feedback_text(user_question)
+    mq_norm = _normalize_feedback_text(matched_question)
+    key = (uq_norm, mq_norm)
+    now = time.time()
+
+    # 完全一致
+    with _improve_cache_lock:
+        entry = _improve_cache.get(key)
+        if entry is not None:
+            if now - entry['ts'] <= IMPROVE_CACHE_TTL:
+                _improve_cache.move_to_end(key)
+                logger.debug("自動改善キャッシュヒット（完全一致）")
+                return entry['result']
+            del _improve_cache[key]
+
+    # 類似一致（同じマッチFAQに対する言い換え報告）
+    emb = None
+    try:
+        emb = _normalize_embedding(
+            get_hybrid_rag().rag_system.vector_store.embed_query(user_question)[0]
+        )
+    except Exception as e:
+        logger.debug(f"フィードバック埋め込み計算失敗: {e}")
+    if emb is not None:
+        with _improve_cache_lock:
+            for other_key, entry in _improve_cache.items():
+                if other_key[1] != mq_norm or entry['emb'] is None:
+                    continue
+                if now - entry['ts'] > IMPROVE_CACHE_TTL:
+                    continue
+                if float(np.dot(emb, entry['emb'])) >= IMPROVE_CACHE_THRESHOLD:
+                    logger.debug("自動改善キャッシュヒット（類似質問）")
+                    return entry['result']
+
+    result = faq_system.auto_improve_qa(user_question, matched_question, matched_answer, timestamp=timestamp)
+
+    with _improve_cache_lock:
+        _improve_cache[key] = {'emb': emb, 'result': result, 'ts': now}
+        while len(_improve_cache) > IMPROVE_CACHE_SIZE:
+            _improve_cache.popitem(last=False)
+    return result
+
 
 # FAQ生成の進捗状況を保存するグローバル変数
 generation_progress = {
@@ -58,6 +369,136 @@ generation_progress = {
     'generated_faqs_list': []  # 生成されたFAQのリスト（質問と位置）
 }
 
+# 進捗dictの読み書き同期（ポーリング中のJSON化とバックグラウンド更新の競合を防ぐ）
+_progress_lock = threading.Lock()
+
+# 読み取り側が参照するイミュータブル扱いのスナップショット
+# （書き込み側がロック中に丸ごと作り直して参照を差し替える。
+#   参照の代入はアトミックなので読み取りはロック不要）
+_progress_snapshot = dict(generation_progress)
+
+
+def _refresh_progress_snapshot_locked():
+    """読み取り用スナップショットを作り直す（_progress_lock保持中に呼ぶこと）"""
+    global _progress_snapshot
+    _progress_snapshot = {key: (value.copy() if isinstance(value, list) else value)
+                          for key, value in generation_progress.items()}
+
+
+def progress_snapshot():
+    """進捗状況のスナップショットを返す（読み取りはロック不要）"""
+    return _progress_snapshot
+
+
+def set_progress(**fields):
+    """進捗フィールドをまとめて更新してスナップショットを差し替える"""
+    with _progress_lock:
+        generation_progress.update(fields)
+        _refresh_progress_snapshot_locked()
+
+
+# SSE購読者（進捗をプッシュ配信するためのキュー一覧）
+_progress_subscribers = []
+_progress_subscribers_lock = threading.Lock()
+
+
+_last_published_snapshot = None
+
+
+def publish_progress():
+    """現在の進捗スナップショットを全SSE購読者に配信する
+
+    スナップショットは状態変更時にしか作り直されないので、
+    前回配信したものと同一オブジェクトなら何もしない。
+    """
+    global _last_published_snapshot
+    snapshot = progress_snapshot()
+    if snapshot is _last_published_snapshot:
+        return
+    _last_published_snapshot = snapshot
+    with _progress_subscribers_lock:
+        subscribers = list(_progress_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(snapshot)
+        except queue.Full:
+            # 購読側が詰まっている場合は古い更新を捨てる（最新状態は次回届く）
+            pass
+
+
+# FAQ生成ワーカー（スレッド数上限付きプール。同時実行は1ジョブまで）
+_faq_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('FAQ_WORKERS', '2')),
+    thread_name_prefix='faqgen'
+)
+_generation_future = None
+_generation_job_lock = threading.Lock()
+
+
+def _cleanup_temp_file(path):
+    """一時ファイルを削除する（存在チェックのstat()は省き、例外で吸収する）"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+        logger.debug(f"一時ファイル削除: {path}")
+
+
+def start_generation_job(target):
+    """FAQ生成ジョブをプールに投入する。すでに実行中のジョブがあればFalseを返す"""
+    global _generation_future
+    with _generation_job_lock:
+        if _generation_future is not None and not _generation_future.done():
+            logger.info("FAQ生成ジョブがすでに実行中のため新規起動をスキップ")
+            return False
+        _generation_future = _faq_executor.submit(target)
+        return True
+
+# CSV再読み込みのmtimeゲート（ファイルが変わっていなければ再パースをスキップ）
+_csv_mtimes = {'faq': -1.0, 'pending': -1.0}
+
+
+def reload_faq_data_if_changed():
+    """faq CSVが更新されているときだけ再読み込みする"""
+    try:
+        mtime = os.path.getmtime(faq_system.csv_file)
+    except OSError:
+        mtime = 0.0
+    if mtime != _csv_mtimes['faq']:
+        faq_system.load_faq_data(faq_system.csv_file)
+        _csv_mtimes['faq'] = mtime
+
+
+def reload_pending_qa_if_changed():
+    """pending CSVが更新されているときだけ再読み込みする"""
+    try:
+        mtime = os.path.getmtime(faq_system.pending_file)
+    except OSError:
+        mtime = 0.0
+    if mtime != _csv_mtimes['pending']:
+        faq_system.load_pending_qa()
+        _csv_mtimes['pending'] = mtime
+
+
+# rejected_patterns.csv への追記は共有ライターで行う
+# （NG登録のたびにopen/closeせず、開きっぱなしのバッファ付きハンドルに書く）
+_ng_fh = None
+_ng_writer = None
+_ng_writer_lock = threading.Lock()
+
+
+def append_rejected_pattern(row):
+    """NGパターン1行を共有ライター経由で追記する"""
+    global _ng_fh, _ng_writer
+    with _ng_writer_lock:
+        if _ng_fh is None:
+            _ng_fh = open('rejected_patterns.csv', 'a', encoding='utf-8',
+                          newline='', buffering=65536)
+            _ng_writer = csv.writer(_ng_fh)
+            atexit.register(_ng_fh.close)
+        _ng_writer.writerow(row)
+        # 読み出し側（NGパターン一覧）がすぐ見えるようフラッシュはする（fsyncはしない）
+        _ng_fh.flush()
+
+
 # 自動バックアップ関数
 def create_auto_backup(reason="manual"):
     """
@@ -65,10 +506,6 @@ def create_auto_backup(reason="manual"):
     Args:
         reason: バックアップの理由（例: "approval", "delete", "edit", "manual"）
     """
-    import zipfile
-    import io
-    import shutil
-    from datetime import datetime
 
     try:
         # backupsディレクトリを確認・作成
@@ -77,12 +514,12 @@ def create_auto_backup(reason="manual"):
             os.makedirs(backup_dir)
 
         # タイムスタンプとバックアップファイル名
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_filename = f'auto_backup_{timestamp}_{reason}.zip'
         backup_path = os.path.join(backup_dir, backup_filename)
 
-        # ZIPファイルを作成
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        # ZIPファイルを作成（CSVは十分縮むのでcompresslevel=1でCPU時間を節約）
+        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
             # FAQ データを追加
             if os.path.exists(faq_system.csv_file):
                 zip_file.write(faq_system.csv_file, os.path.basename(faq_system.csv_file))
@@ -95,7 +532,7 @@ def create_auto_backup(reason="manual"):
             if os.path.exists('unsatisfied_qa.csv'):
                 zip_file.write('unsatisfied_qa.csv', 'unsatisfied_qa.csv')
 
-        print(f"[BACKUP] 自動バックアップ作成: {backup_filename}")
+        logger.info(f"自動バックアップ作成: {backup_filename}")
 
         # 古いバックアップを削除（最新100個だけ保持）
         cleanup_old_backups(backup_dir, keep_count=100)
@@ -103,11 +540,84 @@ def create_auto_backup(reason="manual"):
         return backup_path
 
     except Exception as e:
-        print(f"[BACKUP ERROR] バックアップ作成エラー: {e}")
-        import traceback
+        logger.error(f"バックアップ作成エラー: {e}")
         traceback.print_exc()
         return None
 
+# バックアップ作成は専用ワーカースレッドに任せる
+# （承認・削除などの管理操作がZIP書き込みの完了を待たないようにする）
+_backup_queue = queue.Queue()
+_backup_recent = {}  # reason -> 最後に受け付けた時刻（バーストの合流用）
+_backup_recent_lock = threading.Lock()
+
+
+def _backup_worker():
+    while True:
+        reason = _backup_queue.get()
+        try:
+            create_auto_backup(reason=reason)
+        except Exception as e:
+            logger.error(f"バックアップワーカーエラー: {e}")
+        finally:
+            _backup_queue.task_done()
+
+
+# --preload環境ではimport時に起動したスレッドはforkでワーカーに残らないため、
+# ワーカースレッドは最初のバックアップ要求時にそのプロセスで起動する
+_backup_worker_pid = None
+_backup_worker_lock = threading.Lock()
+
+
+def _ensure_backup_worker():
+    """バックアップワーカースレッドを現在のプロセスで起動する"""
+    global _backup_worker_pid
+    pid = os.getpid()
+    if _backup_worker_pid == pid:
+        return
+    with _backup_worker_lock:
+        if _backup_worker_pid != pid:
+            threading.Thread(target=_backup_worker, daemon=True, name='backup-worker').start()
+            _backup_worker_pid = pid
+
+
+def request_auto_backup(reason="manual"):
+    """バックアップをキューに積む。同じ理由が2秒以内に連続したら合流させる"""
+    _ensure_backup_worker()
+    now = time.time()
+    with _backup_recent_lock:
+        if now - _backup_recent.get(reason, 0.0) < 2.0:
+            return
+        _backup_recent[reason] = now
+    _backup_queue.put(reason)
+
+
+# RAGリロードのデバウンス:
+# reload_faqs_to_rag()は全FAQの再エンベディングを伴うため、リクエスト内で
+# 同期実行すると承認のたびに数秒ブロックする。タイマーで2秒の静止期間を
+# 待ってから実行し、連続する承認を1回のリロードにまとめる
+_rag_reload_timer = None
+_rag_reload_lock = threading.Lock()
+
+
+def schedule_rag_reload():
+    """RAGのFAQリロードをバックグラウンドに予約する（2秒以内の連続要求は合流）"""
+    global _rag_reload_timer
+    with _rag_reload_lock:
+        if _rag_reload_timer is not None:
+            _rag_reload_timer.cancel()
+        _rag_reload_timer = threading.Timer(2.0, _run_rag_reload)
+        _rag_reload_timer.daemon = True
+        _rag_reload_timer.start()
+
+
+def _run_rag_reload():
+    try:
+        get_hybrid_rag().reload_faqs_to_rag()
+        logger.info("RAGのFAQリロード完了")
+    except Exception as e:
+        logger.error(f"RAGリロードエラー: {e}")
+
+
 def cleanup_old_backups(backup_dir, keep_count=20):
     """
     古いバックアップファイルを削除
@@ -116,23 +626,25 @@ def cleanup_old_backups(backup_dir, keep_count=20):
         keep_count: 保持するバックアップファイル数
     """
     try:
-        # バックアップファイル一覧を取得
-        backup_files = [
-            f for f in os.listdir(backup_dir)
-            if f.startswith('auto_backup_') and f.endswith('.zip')
-        ]
+        # scandirならディレクトリ走査時にstat情報も取れるので、
+        # ファイルごとのgetmtime呼び出し（追加のsyscall）が不要になる
+        with os.scandir(backup_dir) as it:
+            backup_files = [
+                (entry.name, entry.stat().st_mtime) for entry in it
+                if entry.name.startswith('auto_backup_') and entry.name.endswith('.zip')
+            ]
 
         # ファイル作成日時でソート（新しい順）
-        backup_files.sort(key=lambda f: os.path.getmtime(os.path.join(backup_dir, f)), reverse=True)
+        backup_files.sort(key=lambda item: item[1], reverse=True)
 
         # 古いファイルを削除
-        for old_file in backup_files[keep_count:]:
+        for old_file, _ in backup_files[keep_count:]:
             old_path = os.path.join(backup_dir, old_file)
             os.remove(old_path)
-            print(f"[BACKUP] 古いバックアップ削除: {old_file}")
+            logger.info(f"古いバックアップ削除: {old_file}")
 
     except Exception as e:
-        print(f"[BACKUP ERROR] バックアップクリーンアップエラー: {e}")
+        logger.error(f"バックアップクリーンアップエラー: {e}")
 
 @app.route('/')
 def index():
@@ -149,32 +661,55 @@ def search():
         return jsonify({'error': '質問を入力してください'}), 400
 
     try:
+        # 完全一致はエンベディング計算もスキップして即返す（リロード連打対策）
+        now = time.time()
+        with _semantic_cache_lock:
+            entry = _semantic_cache.get(question)
+            if entry is not None and now - entry['ts'] <= SEMANTIC_CACHE_TTL:
+                _semantic_cache.move_to_end(question)
+                exact_body = entry['body']
+            else:
+                exact_body = None
+        if exact_body is not None:
+            logger.debug(f"完全一致キャッシュヒット: {question[:30]}")
+            return exact_body, 200, _SEARCH_JSON_HEADERS
+
+        # セマンティックキャッシュを確認（言い換え質問なら即座に返す）
+        query_embedding = get_hybrid_rag().rag_system.vector_store.embed_query(question)[0]
+        cached_body = _semantic_cache_lookup(query_embedding)
+        if cached_body is not None:
+            logger.debug(f"セマンティックキャッシュヒット: {question[:30]}")
+            return cached_body, 200, _SEARCH_JSON_HEADERS
+
         # ハイブリッドRAGシステムで回答を取得（FAQ優先、なければRAG生成）
-        result = hybrid_rag.answer_question(question)
+        result = get_hybrid_rag().answer_question(question)
 
         # 回答ソースに応じてレスポンスを構築
         if result['source'] == 'FAQ':
             # FAQから回答が見つかった場合
-            return jsonify({
+            payload = {
                 'needs_confirmation': False,
                 'answer': result['answer'],
                 'matched_question': result.get('faq_question', ''),
                 'source': 'FAQ',
                 'similarity': result.get('similarity', 0)
-            })
+            }
         else:
             # RAGで回答を生成した場合
-            return jsonify({
+            payload = {
                 'needs_confirmation': False,
                 'answer': result['answer'],
                 'matched_question': None,
                 'source': 'RAG',
                 'num_sources': result.get('num_sources', 0)
-            })
+            }
+
+        body = _serialize_search_payload(payload)
+        _semantic_cache_store(question, query_embedding, body)
+        return body, 200, _SEARCH_JSON_HEADERS
 
     except Exception as e:
-        print(f"[ERROR] ハイブリッドRAG検索エラー: {e}")
-        import traceback
+        logger.error(f"ハイブリッドRAG検索エラー: {e}")
         traceback.print_exc()
         return jsonify({'error': f'検索エラーが発生しました: {str(e)}'}), 500
 
@@ -187,10 +722,12 @@ def backup_page():
 
     try:
         if os.path.exists(backup_dir):
-            files = [f for f in os.listdir(backup_dir) if f.endswith('.zip')]
-            for filename in files:
-                filepath = os.path.join(backup_dir, filename)
-                file_stat = os.stat(filepath)
+            # scandirはstat情報込みで走査できるので、ファイルごとのos.statが不要
+            with os.scandir(backup_dir) as it:
+                entries = [e for e in it if e.name.endswith('.zip')]
+            for entry in entries:
+                filename = entry.name
+                file_stat = entry.stat()
 
                 # ファイル名から情報を抽出（例: auto_backup_20250128_133045_approval.zip）
                 parts = filename.replace('.zip', '').split('_')
@@ -217,29 +754,52 @@ def backup_page():
             # 作成日時で降順ソート（新しい順）
             backup_files.sort(key=lambda x: x['created_at'], reverse=True)
     except Exception as e:
-        print(f"[ERROR] バックアップ一覧取得エラー: {e}")
+        logger.error(f"バックアップ一覧取得エラー: {e}")
 
     return render_template('backup.html', backup_files=backup_files)
 
+# 管理画面のレンダリング結果キャッシュ（サーバー側のみ。クライアントにはno-storeのまま）
+_admin_html_cache = {'mtime': None, 'html': None, 'exp': 0.0}
+_admin_html_cache_lock = threading.Lock()
+
+
 @app.route('/admin')
 def admin():
     """管理画面"""
     try:
-        # 最新データを再読み込み
-        faq_system.load_faq_data(faq_system.csv_file)
-        faqs = faq_system.faq_data
-        print(f"[DEBUG] 管理画面: FAQデータ件数 = {len(faqs)}")
-        print(f"[DEBUG] 最初の3件: {[faq.get('question', '')[:30] for faq in faqs[:3]]}")
-        response = make_response(render_template('admin.html', faqs=faqs))
+        # CSVのmtimeが変わらず5秒以内なら、パースもJinja2レンダリングも省略する
+        try:
+            csv_mtime = os.path.getmtime(faq_system.csv_file)
+        except OSError:
+            csv_mtime = None
+        now = time.time()
+        with _admin_html_cache_lock:
+            if (_admin_html_cache['html'] is not None
+                    and _admin_html_cache['mtime'] == csv_mtime
+                    and now < _admin_html_cache['exp']):
+                html = _admin_html_cache['html']
+            else:
+                html = None
+
+        if html is None:
+            # 最新データを再読み込み（CSVが変わっていなければキャッシュを使う）
+            reload_faq_data_if_changed()
+            faqs = faq_system.faq_data
+            logger.debug(f"管理画面: FAQデータ件数 = {len(faqs)}")
+            logger.debug(f"最初の3件: {[faq.get('question', '')[:30] for faq in faqs[:3]]}")
+            html = render_template('admin.html', faqs=faqs)
+            with _admin_html_cache_lock:
+                _admin_html_cache.update(mtime=csv_mtime, html=html, exp=now + 5.0)
+
+        response = make_response(html)
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
         return response
     except Exception as e:
-        import traceback
         error_details = traceback.format_exc()
-        print(f"[ERROR] 管理画面エラー: {e}")
-        print(error_details)
+        logger.error(f"管理画面エラー: {e}")
+        logger.error(error_details)
         return f"<h1>エラー</h1><pre>{error_details}</pre>", 500
 
 @app.route('/admin/add_faq')
@@ -274,8 +834,9 @@ def edit_faq(index):
 
     if faq_system.edit_faq(index, question if question else None, answer if answer else None, category if category else None):
         faq_system.save_faq_data()
-        # 自動バックアップを作成
-        create_auto_backup(reason="edit")
+        # キャッシュ済み回答を破棄して自動バックアップを作成
+        clear_semantic_cache()
+        request_auto_backup(reason="edit")
 
     return redirect(url_for('admin'))
 
@@ -284,25 +845,21 @@ def delete_faq(index):
     """FAQ削除"""
     faq_system.delete_faq(index)
     faq_system.save_faq_data()
-    # 自動バックアップを作成
-    create_auto_backup(reason="delete")
+    # キャッシュ済み回答を破棄して自動バックアップを作成
+    clear_semantic_cache()
+    request_auto_backup(reason="delete")
     return redirect(url_for('admin'))
 
 @app.route('/admin/export_all', methods=['GET'])
 def export_all():
     """全データ（FAQ + 承認待ち）をZIPでエクスポート"""
-    import io
-    import zipfile
-    from datetime import datetime
-    import shutil
-    import os
 
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 
     # 一時的なメモリ上のZIPファイルを作成
     zip_buffer = io.BytesIO()
 
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
         # FAQ データを追加
         if os.path.exists(faq_system.csv_file):
             zip_file.write(faq_system.csv_file, os.path.basename(faq_system.csv_file))
@@ -317,53 +874,98 @@ def export_all():
 
     zip_buffer.seek(0)
 
-    response = make_response(zip_buffer.read())
-    response.headers['Content-Type'] = 'application/zip'
-    response.headers['Content-Disposition'] = f'attachment; filename=faq_system_backup_{timestamp}.zip'
-
-    return response
+    # BytesIOをそのまま渡してチャンク送信させる（read()による全量コピーを避ける）
+    # conditional=TrueでRangeリクエスト（ダウンロード再開）にも応答する
+    return send_file(
+        zip_buffer,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f'faq_system_backup_{timestamp}.zip',
+        conditional=True
+    )
 
 @app.route('/admin/export_pending', methods=['GET'])
 def export_pending_faq():
     """承認待ちFAQデータをCSVとしてエクスポート"""
-    import io
-    from datetime import datetime
-
-    # 最新データを再読み込み
-    faq_system.load_pending_qa()
-
-    # CSVデータを作成
-    output = io.StringIO()
-    import csv
-    writer = csv.DictWriter(output, fieldnames=['id', 'question', 'answer', 'keywords', 'category', 'created_at', 'user_question', 'confirmation_request'])
-    writer.writeheader()
-    for pending in faq_system.pending_qa:
-        writer.writerow({
-            'id': pending.get('id', ''),
-            'question': pending.get('question', ''),
-            'answer': pending.get('answer', ''),
-            'keywords': pending.get('keywords', ''),
-            'category': pending.get('category', '一般'),
-            'created_at': pending.get('created_at', ''),
-            'user_question': pending.get('user_question', ''),
-            'confirmation_request': pending.get('confirmation_request', '0')
-        })
-
-    # レスポンスを作成（BOM付きUTF-8）
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    csv_content = '\ufeff' + output.getvalue()  # BOMを先頭に追加
-    response = make_response(csv_content.encode('utf-8'))
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=pending_faq_backup_{timestamp}.csv'
 
-    return response
+    # 最新データを再読み込み（CSVが変わっていなければキャッシュを使う）
+    reload_pending_qa_if_changed()
+
+    fieldnames = ['id', 'question', 'answer', 'keywords', 'category',
+                  'created_at', 'user_question', 'confirmation_request']
+    pending = list(faq_system.pending_qa)
+
+    def generate():
+        """CSVをジェネレータで逐次書き出す（全体をメモリ上に組み立てない）"""
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
+        yield b'\xef\xbb\xbf'  # Excel向けのUTF-8 BOM
+        writer.writeheader()
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+        # 500行ずつwriterows()でまとめて書く（行ループをCレベルで回しつつ、
+        # チャンク単位のyieldでストリーミングは維持する）
+        for start in range(0, len(pending), 500):
+            writer.writerows({
+                'id': p.get('id', ''),
+                'question': p.get('question', ''),
+                'answer': p.get('answer', ''),
+                'keywords': p.get('keywords', ''),
+                'category': p.get('category') or '一般',
+                'created_at': p.get('created_at', ''),
+                'user_question': p.get('user_question', ''),
+                'confirmation_request': p.get('confirmation_request') or '0',
+            } for p in pending[start:start + 500])
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        generate(),
+        mimetype='text/csv',
+        headers={'Content-Disposition':
+                 f'attachment; filename=pending_faq_backup_{timestamp}.csv'}
+    )
+
+def _restore_csvs_from_zip(zf):
+    """ZIP内の既知CSVを復元先へ書き出し、復元したデータ種別ラベルの一覧を返す
+
+    import_allとrestore_from_backupで共有するコードパス。各エントリは
+    復元先の隣の一時ファイルへ1MiBチャンクでストリーム展開してから
+    os.replaceでアトミックに差し替える（展開ディレクトリの往復も、
+    復元途中の中途半端なCSVを読まれる心配もない）。
+    """
+    # (ZIP内のエントリ名, 復元先パス, 表示ラベル, 旧バックアップでのエントリ名)
+    mapping = [
+        (os.path.basename(faq_system.csv_file), faq_system.csv_file, 'FAQ', 'faq_data-1.csv'),
+        ('pending_qa.csv', 'pending_qa.csv', '承認待ち', None),
+        ('unsatisfied_qa.csv', 'unsatisfied_qa.csv', '不満足', None),
+    ]
+    # エントリ名はsetにしてO(1)で照合する
+    names = set(zf.namelist())
+    restored = []
+    for entry_name, dest_path, label, alt_name in mapping:
+        if entry_name not in names:
+            if alt_name is None or alt_name not in names:
+                continue
+            entry_name = alt_name
+        # 異常に大きいエントリ（ZIP爆弾）は展開前に弾く
+        if zf.getinfo(entry_name).file_size > 100 * 1024 * 1024:
+            logger.error(f"ZIPエントリが大きすぎるためスキップ: {entry_name}")
+            continue
+        tmp_path = dest_path + '.tmp'
+        with zf.open(entry_name) as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp_path, dest_path)
+        restored.append(label)
+    return restored
+
 
 @app.route('/admin/import_all', methods=['POST'])
 def import_all():
     """ZIPファイルから全データをインポート"""
-    import zipfile
-    import os
-    import shutil
 
     # ファイルアップロードの確認
     if 'backup_file' not in request.files:
@@ -377,65 +979,28 @@ def import_all():
         return redirect(url_for('backup_page') + '?error=invalid_file')
 
     try:
-        # 一時ファイルに保存
-        import tempfile
-        temp_dir = tempfile.mkdtemp()
-        zip_path = os.path.join(temp_dir, 'backup.zip')
-        file.save(zip_path)
-
-        # ZIPファイルを解凍
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        # 各CSVファイルを復元
-        restored_files = []
-
-        # FAQデータ（古いファイル名も考慮）
-        faq_file_new = os.path.join(temp_dir, os.path.basename(faq_system.csv_file))
-        faq_file_old = os.path.join(temp_dir, 'faq_data-1.csv')
-        if os.path.exists(faq_file_new):
-            shutil.copy(faq_file_new, faq_system.csv_file)
-            restored_files.append('FAQ')
-        elif os.path.exists(faq_file_old):
-            shutil.copy(faq_file_old, faq_system.csv_file)
-            restored_files.append('FAQ')
-
-        # 承認待ちデータ
-        pending_file = os.path.join(temp_dir, 'pending_qa.csv')
-        if os.path.exists(pending_file):
-            shutil.copy(pending_file, 'pending_qa.csv')
-            restored_files.append('承認待ち')
-
-        # 不満足データ
-        unsatisfied_file = os.path.join(temp_dir, 'unsatisfied_qa.csv')
-        if os.path.exists(unsatisfied_file):
-            shutil.copy(unsatisfied_file, 'unsatisfied_qa.csv')
-            restored_files.append('不満足')
-
-        # 一時ファイルを削除
-        shutil.rmtree(temp_dir)
-
-        # データを再読み込み
-        faq_system.load_faq_data(faq_system.csv_file)
-        faq_system.load_pending_qa()
+        # アップロードされたZIPをそのまま開き、必要なCSVだけ直接書き出す
+        # （一時ディレクトリへの展開 + shutil.copy の往復を省く）
+        with zipfile.ZipFile(file.stream) as zf:
+            restored_files = _restore_csvs_from_zip(zf)
+
+        # データを再読み込み（mtimeキャッシュも更新され、以後の管理画面は再パースを省ける）
+        reload_faq_data_if_changed()
+        reload_pending_qa_if_changed()
 
         restored_str = '、'.join(restored_files)
-        print(f"[DEBUG] バックアップ復元完了: {restored_str}")
+        logger.debug(f"バックアップ復元完了: {restored_str}")
 
         return redirect(url_for('backup_page') + f'?success=restore&files={len(restored_files)}')
 
     except Exception as e:
-        print(f"[ERROR] バックアップ復元エラー: {e}")
-        import traceback
+        logger.error(f"バックアップ復元エラー: {e}")
         traceback.print_exc()
         return redirect(url_for('backup_page') + '?error=restore_failed')
 
 @app.route('/admin/restore_from_backup/<filename>', methods=['POST'])
 def restore_from_backup(filename):
     """バックアップディレクトリから直接復元"""
-    import zipfile
-    import shutil
-    import tempfile
 
     try:
         backup_path = os.path.join('backups', filename)
@@ -444,99 +1009,71 @@ def restore_from_backup(filename):
         if not os.path.exists(backup_path):
             return redirect(url_for('backup_page') + '?error=file_not_found')
 
-        # 一時ディレクトリを作成
-        temp_dir = tempfile.mkdtemp()
-
-        # ZIPファイルを解凍
-        with zipfile.ZipFile(backup_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        # 各CSVファイルを復元
-        restored_files = []
-
-        # FAQデータ（古いファイル名も考慮）
-        faq_file_new = os.path.join(temp_dir, os.path.basename(faq_system.csv_file))
-        faq_file_old = os.path.join(temp_dir, 'faq_data-1.csv')
-        if os.path.exists(faq_file_new):
-            shutil.copy(faq_file_new, faq_system.csv_file)
-            restored_files.append('FAQ')
-        elif os.path.exists(faq_file_old):
-            shutil.copy(faq_file_old, faq_system.csv_file)
-            restored_files.append('FAQ')
-
-        # 承認待ちデータ
-        pending_file = os.path.join(temp_dir, 'pending_qa.csv')
-        if os.path.exists(pending_file):
-            shutil.copy(pending_file, 'pending_qa.csv')
-            restored_files.append('承認待ち')
-
-        # 不満足データ
-        unsatisfied_file = os.path.join(temp_dir, 'unsatisfied_qa.csv')
-        if os.path.exists(unsatisfied_file):
-            shutil.copy(unsatisfied_file, 'unsatisfied_qa.csv')
-            restored_files.append('不満足')
-
-        # 一時ファイルを削除
-        shutil.rmtree(temp_dir)
-
-        # データを再読み込み
-        faq_system.load_faq_data(faq_system.csv_file)
-        faq_system.load_pending_qa()
+        # 共通ヘルパーでZIPから直接復元（import_allと同一のコードパス）
+        with zipfile.ZipFile(backup_path, 'r') as zf:
+            restored_files = _restore_csvs_from_zip(zf)
+
+        # データを再読み込み（mtimeキャッシュも更新され、以後の管理画面は再パースを省ける）
+        reload_faq_data_if_changed()
+        reload_pending_qa_if_changed()
 
-        # ハイブリッドRAGシステムをリロード
-        hybrid_rag.reload_faqs_to_rag()
+        # ハイブリッドRAGシステムのリロードを予約（リクエストをブロックしない）
+        schedule_rag_reload()
+        clear_semantic_cache()
 
         restored_str = '、'.join(restored_files)
-        print(f"[BACKUP] バックアップから復元完了: {filename} ({restored_str})")
+        logger.info(f"バックアップから復元完了: {filename} ({restored_str})")
 
         return redirect(url_for('backup_page') + f'?success=restore&files={len(restored_files)}')
 
     except Exception as e:
-        print(f"[BACKUP ERROR] バックアップ復元エラー: {e}")
-        import traceback
+        logger.error(f"バックアップ復元エラー: {e}")
         traceback.print_exc()
         return redirect(url_for('backup_page') + '?error=restore_failed')
 
 @app.route('/admin/batch_delete', methods=['POST'])
 def batch_delete_faq():
     """複数のFAQをまとめて削除"""
-    print(f"[DEBUG] 受信したフォームデータ全体: {dict(request.form)}")
-    print(f"[DEBUG] request.form.getlist('faq_indices'): {request.form.getlist('faq_indices')}")
-    print(f"[DEBUG] request.form.keys(): {list(request.form.keys())}")
+    # 遅延%フォーマット: DEBUG無効時はdict(request.form)のコピー自体を作らない
+    logger.debug("受信したフォームデータ全体: %s", request.form)
+    logger.debug("request.form.getlist('faq_indices'): %s", request.form.getlist('faq_indices'))
+    logger.debug("request.form.keys(): %s", request.form.keys())
 
     faq_indices = request.form.getlist('faq_indices')
 
     if not faq_indices:
-        print("[DEBUG] まとめて削除: 選択されたFAQがありません")
+        logger.debug("まとめて削除: 選択されたFAQがありません")
         return redirect(url_for('admin'))
 
-    # 最新データを再読み込み
-    faq_system.load_faq_data(faq_system.csv_file)
+    # 最新データを再読み込み（CSVが変わっていなければキャッシュを使う）
+    reload_faq_data_if_changed()
 
-    # インデックスを降順にソートして削除（大きい方から削除しないとインデックスがずれる）
-    indices = sorted([int(idx) for idx in faq_indices], reverse=True)
+    index_set = {int(idx) for idx in faq_indices}
+    valid_indices = {idx for idx in index_set if 0 <= idx < len(faq_system.faq_data)}
 
-    print(f"[DEBUG] まとめて削除開始 - 対象インデックス: {indices}")
-    print(f"[DEBUG] 削除前のFAQ件数: {len(faq_system.faq_data)}")
+    logger.debug(f"まとめて削除開始 - 対象インデックス: {sorted(valid_indices)}")
+    logger.debug(f"削除前のFAQ件数: {len(faq_system.faq_data)}")
 
-    success_count = 0
-    for idx in indices:
-        try:
-            if 0 <= idx < len(faq_system.faq_data):
-                deleted_question = faq_system.faq_data[idx].get('question', '')[:30]
-                faq_system.delete_faq(idx)
-                success_count += 1
-                print(f"[DEBUG] FAQ削除成功: インデックス {idx} - {deleted_question}")
-            else:
-                print(f"[DEBUG] FAQ削除スキップ: インデックス {idx} は範囲外")
-        except Exception as e:
-            print(f"[DEBUG] FAQ削除失敗: インデックス {idx}, エラー: {e}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for idx in sorted(valid_indices):
+            logger.debug(f"FAQ削除: インデックス {idx} - {faq_system.faq_data[idx].get('question', '')[:30]}")
+        for idx in sorted(index_set - valid_indices):
+            logger.debug(f"FAQ削除スキップ: インデックス {idx} は範囲外")
 
+    # 1パスのまとめ削除 + CSV書き出し1回
+    success_count = faq_system.delete_faqs(index_set)
     faq_system.save_faq_data()
-    # 削除後に最新データを再読み込み
-    faq_system.load_faq_data(faq_system.csv_file)
-    print(f"[DEBUG] 削除後のFAQ件数: {len(faq_system.faq_data)}")
-    print(f"[DEBUG] まとめて削除完了 - 成功: {success_count}件")
+    # メモリ上のfaq_dataが正なので再読み込みは不要。mtimeキャッシュだけ合わせる
+    try:
+        _csv_mtimes['faq'] = os.path.getmtime(faq_system.csv_file)
+    except OSError:
+        pass
+    # キャッシュ済み回答を破棄
+    clear_semantic_cache()
+    # バックアップはバッチ全体で1回だけ
+    request_auto_backup(reason="batch_delete")
+    logger.debug(f"削除後のFAQ件数: {len(faq_system.faq_data)}")
+    logger.debug(f"まとめて削除完了 - 成功: {success_count}件")
     return redirect(url_for('admin'))
 
 @app.route('/interactive_improvement')
@@ -547,195 +1084,137 @@ def interactive_improvement():
 @app.route('/admin/review')
 def review_pending():
     """承認待ちQ&A一覧"""
-    # 最新データを再読み込み
-    faq_system.load_pending_qa()
+    # 最新データを再読み込み（CSVが変わっていなければキャッシュを使う）
+    reload_pending_qa_if_changed()
     pending_items = faq_system.pending_qa
-    print(f"[DEBUG] 承認待ち画面: 承認待ちアイテム数 = {len(pending_items)}")
+    logger.debug(f"承認待ち画面: 承認待ちアイテム数 = {len(pending_items)}")
     return render_template('review_pending.html', pending_items=pending_items)
 
 @app.route('/admin/approve/<qa_id>', methods=['POST'])
 def approve_qa(qa_id):
     """Q&Aを承認してFAQに追加"""
     if faq_system.approve_pending_qa(qa_id):
-        faq_system.save_faq_data()
-        print(f"[DEBUG] Q&A承認成功: {qa_id}")
+        # approve_pending_qaが承認行をfaq_database.csvに1行追記済み。
+        # 全件リライトやpending込みのマージ再構築はしない
+        logger.debug(f"Q&A承認成功: {qa_id}")
 
         # 自動バックアップを作成
-        create_auto_backup(reason="approval")
-
-        # faq_database.csvを更新（検索用）
-        import csv
-        faq_data_list = []
-        # faq_data.csvから読み込み
-        faq_file = os.path.join(faq_system_dir, 'faq_data.csv')
-        if os.path.exists(faq_file):
-            with open(faq_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get('question', '').strip():
-                        faq_data_list.append(row)
-        # pending_qa.csvから読み込み
-        pending_file = os.path.join(os.path.dirname(__file__), 'pending_qa.csv')
-        if os.path.exists(pending_file):
-            with open(pending_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get('question', '').strip():
-                        faq_data_list.append(row)
-        # faq_database.csvに保存
-        faq_db_file = os.path.join(os.path.dirname(__file__), 'faq_database.csv')
-        with open(faq_db_file, 'w', encoding='utf-8', newline='') as f:
-            if faq_data_list:
-                fieldnames = ['id', 'question', 'answer', 'keywords', 'category', 'created_at']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for faq in faq_data_list:
-                    writer.writerow({
-                        'id': faq.get('id', ''),
-                        'question': faq.get('question', ''),
-                        'answer': faq.get('answer', ''),
-                        'keywords': faq.get('keywords', ''),
-                        'category': faq.get('category', ''),
-                        'created_at': faq.get('created_at', '')
-                    })
-        print(f"[DEBUG] faq_database.csv更新完了: {len(faq_data_list)}件")
-
-        # ハイブリッドRAGシステムをリロード
-        hybrid_rag.reload_faqs_to_rag()
-        print(f"[DEBUG] ハイブリッドRAGシステムのFAQデータをリロードしました")
+        request_auto_backup(reason="approval")
+
+        # ハイブリッドRAGシステムのリロードを予約（リクエストをブロックしない）
+        schedule_rag_reload()
+        # FAQが変わったのでキャッシュ済み回答を破棄
+        clear_semantic_cache()
+        logger.debug(f"ハイブリッドRAGシステムのFAQデータをリロードしました")
     else:
-        print(f"[DEBUG] Q&A承認失敗: {qa_id}")
+        logger.debug(f"Q&A承認失敗: {qa_id}")
     return redirect(url_for('review_pending'))
 
 @app.route('/admin/reject/<qa_id>', methods=['POST'])
 def reject_qa(qa_id):
     """Q&Aを却下"""
     if faq_system.reject_pending_qa(qa_id):
-        print(f"[DEBUG] Q&A却下成功: {qa_id}")
+        logger.debug(f"Q&A却下成功: {qa_id}")
         # 自動バックアップを作成
-        create_auto_backup(reason="reject")
+        request_auto_backup(reason="reject")
     else:
-        print(f"[DEBUG] Q&A却下失敗: {qa_id}")
+        logger.debug(f"Q&A却下失敗: {qa_id}")
     return redirect(url_for('review_pending'))
 
 @app.route('/admin/mark_question_ng/<qa_id>', methods=['POST'])
 def mark_question_ng(qa_id):
     """質問をNG登録（不適切な質問として学習、FAQは残す）"""
-    import re
-    from datetime import datetime
 
     try:
         # 承認待ちQ&Aを取得
-        faq_system.load_pending_qa()
-        pending_item = None
-        for item in faq_system.pending_qa:
-            if item['id'] == qa_id:
-                pending_item = item
-                break
+        reload_pending_qa_if_changed()
+        pending_item = faq_system.pending_qa_by_id.get(qa_id)
 
         if not pending_item:
-            print(f"[DEBUG] 質問NG登録失敗: アイテムが見つかりません - {qa_id}")
+            logger.debug(f"質問NG登録失敗: アイテムが見つかりません - {qa_id}")
             return redirect(url_for('review_pending'))
 
         # window_info から位置を抽出
         window_info = pending_item.get('window_info', '')
         window_position = None
         if window_info:
-            match = re.search(r'位置:\s*(\d+)', window_info)
+            match = _POSITION_RE.search(window_info)
             if match:
                 window_position = int(match.group(1))
 
-        print(f"[DEBUG] 質問NG登録 - ID: {qa_id}")
-        print(f"[DEBUG] NG質問: {pending_item['question']}")
+        logger.debug(f"質問NG登録 - ID: {qa_id}")
+        logger.debug(f"NG質問: {pending_item['question']}")
 
         # rejected_patterns.csv に記録（type=question）
-        rejected_file = 'rejected_patterns.csv'
-        import csv
-        with open(rejected_file, 'a', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                pending_item.get('question', ''),
-                pending_item.get('answer', ''),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                window_position if window_position else '',
-                '',  # chunk_textは空
-                'question'  # type
-            ])
-        print(f"[DEBUG] rejected_patterns.csv に記録しました（type=question）")
+        append_rejected_pattern([
+            pending_item.get('question', ''),
+            pending_item.get('answer', ''),
+            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            window_position if window_position else '',
+            '',  # chunk_textは空
+            'question'  # type
+        ])
+        logger.debug(f"rejected_patterns.csv に記録しました（type=question）")
 
         # バックアップ作成（FAQは削除しない）
-        create_auto_backup(reason="mark_question_ng")
+        request_auto_backup(reason="mark_question_ng")
 
         return redirect(url_for('review_pending'))
 
     except Exception as e:
-        print(f"[ERROR] 質問NG登録処理でエラー: {e}")
-        import traceback
+        logger.error(f"質問NG登録処理でエラー: {e}")
         traceback.print_exc()
         return redirect(url_for('review_pending'))
 
 @app.route('/admin/mark_answer_ng/<qa_id>', methods=['POST'])
 def mark_answer_ng(qa_id):
     """回答をNG登録（不適切な回答として学習、FAQは残す）"""
-    import re
-    from datetime import datetime
 
     try:
         # 承認待ちQ&Aを取得
-        faq_system.load_pending_qa()
-        pending_item = None
-        for item in faq_system.pending_qa:
-            if item['id'] == qa_id:
-                pending_item = item
-                break
+        reload_pending_qa_if_changed()
+        pending_item = faq_system.pending_qa_by_id.get(qa_id)
 
         if not pending_item:
-            print(f"[DEBUG] 回答NG登録失敗: アイテムが見つかりません - {qa_id}")
+            logger.debug(f"回答NG登録失敗: アイテムが見つかりません - {qa_id}")
             return redirect(url_for('review_pending'))
 
         # window_info から位置を抽出
         window_info = pending_item.get('window_info', '')
         window_position = None
         if window_info:
-            match = re.search(r'位置:\s*(\d+)', window_info)
+            match = _POSITION_RE.search(window_info)
             if match:
                 window_position = int(match.group(1))
 
-        print(f"[DEBUG] 回答NG登録 - ID: {qa_id}")
-        print(f"[DEBUG] 質問: {pending_item['question']}")
-        print(f"[DEBUG] NG回答: {pending_item['answer'][:50]}...")
+        logger.debug(f"回答NG登録 - ID: {qa_id}")
+        logger.debug(f"質問: {pending_item['question']}")
+        logger.debug(f"NG回答: {pending_item['answer'][:50]}...")
 
         # rejected_patterns.csv に記録（type=answer）
-        rejected_file = 'rejected_patterns.csv'
-        import csv
-        with open(rejected_file, 'a', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                pending_item.get('question', ''),
-                pending_item.get('answer', ''),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                window_position if window_position else '',
-                '',  # chunk_textは空
-                'answer'  # type
-            ])
-        print(f"[DEBUG] rejected_patterns.csv に記録しました（type=answer）")
+        append_rejected_pattern([
+            pending_item.get('question', ''),
+            pending_item.get('answer', ''),
+            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            window_position if window_position else '',
+            '',  # chunk_textは空
+            'answer'  # type
+        ])
+        logger.debug(f"rejected_patterns.csv に記録しました（type=answer）")
 
         # バックアップ作成（FAQは削除しない）
-        create_auto_backup(reason="mark_answer_ng")
+        request_auto_backup(reason="mark_answer_ng")
 
         return redirect(url_for('review_pending'))
 
     except Exception as e:
-        print(f"[ERROR] 回答NG登録処理でエラー: {e}")
-        import traceback
+        logger.error(f"回答NG登録処理でエラー: {e}")
         traceback.print_exc()
         return redirect(url_for('review_pending'))
 
 @app.route('/admin/rejected_patterns')
 def rejected_patterns_page():
     """NGデータ管理画面"""
-    import csv
-    import os
 
     rejected_patterns = []
     rejected_file = 'rejected_patterns.csv'
@@ -747,7 +1226,7 @@ def rejected_patterns_page():
                 for row in reader:
                     rejected_patterns.append(row)
     except Exception as e:
-        print(f"[ERROR] rejected_patterns.csv 読み込みエラー: {e}")
+        logger.error(f"rejected_patterns.csv 読み込みエラー: {e}")
 
     # 新しい順にソート
     rejected_patterns.reverse()
@@ -757,8 +1236,6 @@ def rejected_patterns_page():
 @app.route('/admin/delete_rejected_pattern/<int:index>', methods=['POST'])
 def delete_rejected_pattern(index):
     """NGパターンを削除"""
-    import csv
-    import os
 
     rejected_file = 'rejected_patterns.csv'
 
@@ -774,7 +1251,7 @@ def delete_rejected_pattern(index):
         actual_index = len(all_patterns) - 1 - index
         if 0 <= actual_index < len(all_patterns):
             deleted_item = all_patterns.pop(actual_index)
-            print(f"[DEBUG] NGパターン削除: {deleted_item.get('question', '')[:30]}...")
+            logger.debug(f"NGパターン削除: {deleted_item.get('question', '')[:30]}...")
 
             # ファイルに書き戻し
             with open(rejected_file, 'w', encoding='utf-8', newline='') as f:
@@ -787,10 +1264,9 @@ def delete_rejected_pattern(index):
                     # 空の場合はヘッダーのみ
                     f.write('question,answer,rejected_at,window_position,chunk_text,type\n')
 
-            create_auto_backup(reason="delete_rejected_pattern")
+            request_auto_backup(reason="delete_rejected_pattern")
     except Exception as e:
-        print(f"[ERROR] NGパターン削除エラー: {e}")
-        import traceback
+        logger.error(f"NGパターン削除エラー: {e}")
         traceback.print_exc()
 
     return redirect(url_for('rejected_patterns_page'))
@@ -798,15 +1274,13 @@ def delete_rejected_pattern(index):
 @app.route('/admin/batch_delete_rejected_patterns', methods=['POST'])
 def batch_delete_rejected_patterns():
     """複数のNGパターンをまとめて削除"""
-    import csv
-    import os
 
     ng_indices = request.form.getlist('ng_indices')
     rejected_file = 'rejected_patterns.csv'
 
     try:
         if not ng_indices:
-            print("[DEBUG] まとめて削除: 選択されたNGパターンがありません")
+            logger.debug("まとめて削除: 選択されたNGパターンがありません")
             return redirect(url_for('rejected_patterns_page'))
 
         # 全データを読み込み
@@ -816,22 +1290,16 @@ def batch_delete_rejected_patterns():
                 reader = csv.DictReader(f)
                 all_patterns = list(reader)
 
-        # インデックスを降順にソートして削除（大きい方から削除しないとインデックスがずれる）
-        indices = sorted([int(idx) for idx in ng_indices], reverse=True)
-
-        # 逆順で表示しているので実際のインデックスを計算
-        actual_indices = [len(all_patterns) - 1 - idx for idx in indices]
-        actual_indices.sort(reverse=True)
+        # 逆順で表示しているので実際のインデックスを計算し、1パスのフィルタで削除する
+        # （pop()のループだと削除1件ごとにO(N)のシフトが発生する）
+        drop_set = {len(all_patterns) - 1 - int(idx) for idx in ng_indices}
+        drop_set = {idx for idx in drop_set if 0 <= idx < len(all_patterns)}
 
-        print(f"[DEBUG] まとめて削除開始 - 対象インデックス: {actual_indices}")
-        print(f"[DEBUG] 削除前のNGパターン数: {len(all_patterns)}")
+        logger.debug(f"まとめて削除開始 - 対象インデックス: {sorted(drop_set, reverse=True)}")
+        logger.debug(f"削除前のNGパターン数: {len(all_patterns)}")
 
-        success_count = 0
-        for idx in actual_indices:
-            if 0 <= idx < len(all_patterns):
-                deleted_item = all_patterns.pop(idx)
-                success_count += 1
-                print(f"[DEBUG] NGパターン削除: {deleted_item.get('question', '')[:30]}...")
+        success_count = len(drop_set)
+        all_patterns = [row for i, row in enumerate(all_patterns) if i not in drop_set]
 
         # ファイルに書き戻し
         with open(rejected_file, 'w', encoding='utf-8', newline='') as f:
@@ -844,14 +1312,13 @@ def batch_delete_rejected_patterns():
                 # 空の場合はヘッダーのみ
                 f.write('question,answer,rejected_at,window_position,chunk_text,type\n')
 
-        print(f"[DEBUG] 削除後のNGパターン数: {len(all_patterns)}")
-        print(f"[DEBUG] まとめて削除完了 - 成功: {success_count}件")
+        logger.debug(f"削除後のNGパターン数: {len(all_patterns)}")
+        logger.debug(f"まとめて削除完了 - 成功: {success_count}件")
 
-        create_auto_backup(reason="batch_delete_rejected_patterns")
+        request_auto_backup(reason="batch_delete_rejected_patterns")
 
     except Exception as e:
-        print(f"[ERROR] NGパターン一括削除エラー: {e}")
-        import traceback
+        logger.error(f"NGパターン一括削除エラー: {e}")
         traceback.print_exc()
 
     return redirect(url_for('rejected_patterns_page'))
@@ -862,7 +1329,7 @@ def batch_reject_qa():
     qa_ids = request.form.getlist('qa_ids')
 
     if not qa_ids:
-        print("[DEBUG] まとめて却下: 選択されたQ&Aがありません")
+        logger.debug("まとめて却下: 選択されたQ&Aがありません")
         return redirect(url_for('review_pending'))
 
     success_count = 0
@@ -871,12 +1338,15 @@ def batch_reject_qa():
     for qa_id in qa_ids:
         if faq_system.reject_pending_qa(qa_id):
             success_count += 1
-            print(f"[DEBUG] Q&A却下成功: {qa_id}")
+            logger.debug(f"Q&A却下成功: {qa_id}")
         else:
             fail_count += 1
-            print(f"[DEBUG] Q&A却下失敗: {qa_id}")
+            logger.debug(f"Q&A却下失敗: {qa_id}")
 
-    print(f"[DEBUG] まとめて却下完了 - 成功: {success_count}, 失敗: {fail_count}")
+    logger.debug(f"まとめて却下完了 - 成功: {success_count}, 失敗: {fail_count}")
+    if success_count:
+        # バックアップはバッチ全体で1回だけ
+        request_auto_backup(reason="batch_reject")
     return redirect(url_for('review_pending'))
 
 @app.route('/admin/edit_pending/<qa_id>', methods=['POST'])
@@ -888,11 +1358,11 @@ def edit_pending_qa(qa_id):
     category = request.form.get('category', '').strip()
 
     if faq_system.edit_pending_qa(qa_id, question, answer, keywords, category):
-        print(f"[DEBUG] 承認待ちQ&A編集成功: {qa_id}")
+        logger.debug(f"承認待ちQ&A編集成功: {qa_id}")
         # 自動バックアップを作成
-        create_auto_backup(reason="edit_pending")
+        request_auto_backup(reason="edit_pending")
     else:
-        print(f"[DEBUG] 承認待ちQ&A編集失敗: {qa_id}")
+        logger.debug(f"承認待ちQ&A編集失敗: {qa_id}")
 
     return redirect(url_for('check_duplicates', qa_id=qa_id))
 
@@ -900,9 +1370,9 @@ def edit_pending_qa(qa_id):
 def toggle_confirmation_request(qa_id):
     """承認待ちFAQの確認依頼フラグを切り替え"""
     if faq_system.toggle_confirmation_request(qa_id):
-        print(f"[DEBUG] 確認依頼切り替え成功: {qa_id}")
+        logger.debug(f"確認依頼切り替え成功: {qa_id}")
     else:
-        print(f"[DEBUG] 確認依頼切り替え失敗: {qa_id}")
+        logger.debug(f"確認依頼切り替え失敗: {qa_id}")
 
     return redirect(url_for('check_duplicates', qa_id=qa_id))
 
@@ -911,93 +1381,144 @@ def check_duplicates(qa_id):
     """承認待ちQ&Aの重複チェック"""
     try:
         # 承認待ちQ&Aを取得
-        faq_system.load_pending_qa()
-        pending_item = None
-        for item in faq_system.pending_qa:
-            if item['id'] == qa_id:
-                pending_item = item
-                break
+        reload_pending_qa_if_changed()
+        pending_item = faq_system.pending_qa_by_id.get(qa_id)
 
         if not pending_item:
-            print(f"[DEBUG] 承認待ちアイテムが見つかりません: {qa_id}")
+            logger.debug(f"承認待ちアイテムが見つかりません: {qa_id}")
             return redirect(url_for('review_pending'))
 
         # 類似FAQ検索
-        faq_system.load_faq_data(faq_system.csv_file)
+        reload_faq_data_if_changed()
         similar_faqs = find_similar_faqs(faq_system, pending_item['question'])
 
-        print(f"[DEBUG] 重複チェック - 質問: {pending_item['question']}")
-        print(f"[DEBUG] 類似FAQ数: {len(similar_faqs)}")
+        logger.debug(f"重複チェック - 質問: {pending_item['question']}")
+        logger.debug(f"類似FAQ数: {len(similar_faqs)}")
 
         return render_template('check_duplicates.html',
                              pending_item=pending_item,
                              similar_faqs=similar_faqs)
     except Exception as e:
-        print(f"[ERROR] 重複チェックでエラー: {e}")
-        import traceback
+        logger.error(f"重複チェックでエラー: {e}")
         traceback.print_exc()
         return f"エラーが発生しました: {e}", 500
 
 @app.route('/admin/generation_progress', methods=['GET'])
 def get_generation_progress():
     """FAQ生成の進捗状況を取得"""
-    return jsonify(generation_progress)
+    snapshot = progress_snapshot()
+
+    # 前回ポーリングから変化がなければ304で返してJSONエンコードと転送を省く
+    etag = f'W/"{snapshot["current"]}-{snapshot["status"]}-{snapshot["retry_count"]}-{snapshot["last_update_time"]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+
+    response = jsonify(snapshot)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/admin/generation_progress/stream', methods=['GET'])
+def generation_progress_stream():
+    """FAQ生成の進捗をSSEでプッシュ配信（ポーリングのフォールバックあり）"""
+    def event_stream():
+        subscriber = queue.Queue(maxsize=10)
+        with _progress_subscribers_lock:
+            _progress_subscribers.append(subscriber)
+        try:
+            # 接続直後に現在の状態を1回送る
+            yield f"data: {json.dumps(progress_snapshot(), ensure_ascii=False)}\n\n"
+            while True:
+                try:
+                    snapshot = subscriber.get(timeout=30)
+                except queue.Empty:
+                    # 更新がない間はkeep-aliveコメントで接続を維持
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+        finally:
+            with _progress_subscribers_lock:
+                if subscriber in _progress_subscribers:
+                    _progress_subscribers.remove(subscriber)
+
+    return Response(
+        event_stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/admin/get_duplicates', methods=['GET'])
 def get_duplicate_faqs():
-    """重複判定されたFAQのリストを取得（デバッグ用）"""
-    return jsonify({
-        'duplicates': faq_system.duplicate_faqs,
-        'total': len(faq_system.duplicate_faqs)
-    })
+    """重複判定されたFAQのリストを取得（デバッグ用）
+
+    リストは生成回数に比例して伸びるため、全体を1つの文字列に
+    組み立てずに要素ごとにシリアライズしてストリーミングで返す。
+    """
+    duplicates = list(faq_system.duplicate_faqs)
+
+    def generate():
+        yield '{"duplicates":['
+        for i, dup in enumerate(duplicates):
+            prefix = '' if i == 0 else ','
+            yield prefix + json.dumps(dup, ensure_ascii=False, separators=(',', ':'))
+        yield f'],"total":{len(duplicates)}}}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/admin/clear_duplicates', methods=['POST'])
 def clear_duplicate_faqs():
     """重複FAQリストをクリア（デバッグ用）"""
     faq_system.duplicate_faqs = []
-    print("[DEBUG] 重複FAQリストをクリアしました")
+    logger.debug("重複FAQリストをクリアしました")
     return jsonify({'success': True, 'message': '重複FAQリストをクリアしました'})
 
 @app.route('/admin/interrupt_generation', methods=['POST'])
 def interrupt_generation():
     """FAQ生成を中断"""
     faq_system.generation_interrupted = True
-    generation_progress['status'] = 'interrupted'
-    print("[INFO] FAQ生成の中断リクエストを受信")
+    set_progress(status='interrupted')
+    publish_progress()
+    logger.info("FAQ生成の中断リクエストを受信")
     return jsonify({'success': True, 'message': 'FAQ生成を中断しました'})
 
+# ファイルベースのデバッグログ（stdoutが見えない場合の対策）
+# 1行ごとにopen/close+flushせず、開きっぱなしのFileHandler経由で
+# バッファ書き込みする（出力形式は従来の [時刻] メッセージ のまま）
+_faq_gen_logger = logging.getLogger('faq_gen')
+_faq_gen_logger.propagate = False
+_faq_gen_logger.setLevel(logging.INFO)
+_faq_gen_handler = logging.FileHandler(
+    os.path.join(os.path.dirname(__file__), 'debug_faq_generation.log'),
+    encoding='utf-8', delay=True
+)
+_faq_gen_handler.setFormatter(
+    logging.Formatter('[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+)
+_faq_gen_logger.addHandler(_faq_gen_handler)
+
+
+def log_debug(message):
+    """FAQ生成フローのデバッグログを共有ハンドラ経由でファイルに書く"""
+    _faq_gen_logger.info(message)
+
+
 @app.route('/admin/auto_generate', methods=['POST'])
 def auto_generate_faqs():
     """FAQ自動生成API"""
-    import sys
-    import os
-    from datetime import datetime
-
-    # ファイルベースのデバッグログ（stdoutが見えない場合の対策）
-    debug_log_path = os.path.join(os.path.dirname(__file__), 'debug_faq_generation.log')
-    def log_debug(message):
-        try:
-            with open(debug_log_path, 'a', encoding='utf-8') as f:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                f.write(f"[{timestamp}] {message}\n")
-                f.flush()
-        except Exception as e:
-            print(f"[ERROR] Failed to write debug log: {e}")
 
     log_debug("=" * 60)
     log_debug("auto_generate_faqs関数が呼び出されました")
-    print("[DEBUG] auto_generate_faqs関数が呼び出されました", flush=True)
-    sys.stdout.flush()
+    logger.debug("auto_generate_faqs関数が呼び出されました")
 
     try:
         # デバッグモード: 米国ビザ申請の手引きVer.21..pdfを固定で使用
         DEBUG_MODE = True
         log_debug(f"DEBUG_MODE = {DEBUG_MODE}")
-        print(f"[DEBUG] DEBUG_MODE = {DEBUG_MODE}")
+        logger.debug(f"DEBUG_MODE = {DEBUG_MODE}")
 
         if DEBUG_MODE:
             log_debug("デバッグモード: 米国ビザ申請の手引きVer.21..pdfを使用")
-            print("[DEBUG] デバッグモード: 米国ビザ申請の手引きVer.21..pdfを使用")
+            logger.debug("デバッグモード: 米国ビザ申請の手引きVer.21..pdfを使用")
             pdf_path = os.path.join(os.path.dirname(__file__), '米国ビザ申請の手引きVer.21..pdf')
             num_questions = int(request.form.get('num_questions', 10))
             category = 'AI生成'
@@ -1013,170 +1534,203 @@ def auto_generate_faqs():
                 return jsonify({'success': False, 'message': error_msg})
 
             log_debug(f"FAQ自動生成開始 - ファイル: 米国ビザ申請の手引きVer.21..pdf, 数: {num_questions}")
-            print(f"[DEBUG] FAQ自動生成開始 - ファイル: 米国ビザ申請の手引きVer.21..pdf, 数: {num_questions}")
+            logger.debug(f"FAQ自動生成開始 - ファイル: 米国ビザ申請の手引きVer.21..pdf, 数: {num_questions}")
 
             # 進捗状況を初期化
-            generation_progress['current'] = 0
-            generation_progress['total'] = num_questions
-            generation_progress['status'] = 'generating'
-            generation_progress['retry_count'] = 0
-            generation_progress['max_retries'] = 10  # ウィンドウごとの最大リトライ回数
-            generation_progress['excluded_windows'] = 0
-            generation_progress['total_windows'] = 0
-            generation_progress['positions_list'] = []  # 成功した位置のリスト
-            generation_progress['rejected_positions'] = []  # 拒否された位置のリスト（赤字表示用）
-            generation_progress['current_trying_position'] = ''  # 現在試行中の位置
-            generation_progress['start_time'] = time.time()  # 生成開始時刻を記録
-            generation_progress['last_update_time'] = time.time()
-            generation_progress['elapsed_time'] = 0
-            generation_progress['generation_speed'] = 0
-            generation_progress['average_speed'] = 0
-            generation_progress['time_per_faq'] = 0
-            generation_progress['generated_faqs_list'] = []  # 生成されたFAQリストを初期化
+            set_progress(
+                current=0,
+                total=num_questions,
+                status='generating',
+                retry_count=0,
+                max_retries=10,  # ウィンドウごとの最大リトライ回数
+                excluded_windows=0,
+                total_windows=0,
+                positions_list=[],  # 成功した位置のリスト
+                rejected_positions=[],  # 拒否された位置のリスト（赤字表示用）
+                current_trying_position='',  # 現在試行中の位置
+                start_time=time.time(),  # 生成開始時刻を記録
+                last_update_time=time.time(),
+                elapsed_time=0,
+                generation_speed=0,
+                average_speed=0,
+                time_per_faq=0,
+                generated_faqs_list=[]  # 生成されたFAQリストを初期化
+            )
 
             # 中断フラグをリセット
             faq_system.generation_interrupted = False
 
             # 進捗更新用コールバックを設定
+            _last_flush = [0.0]
+            _last_sample = [0, time.time()]  # EWMA速度計算用の前回ティック (件数, 時刻)
+            _positions_seen = set()  # positions_list重複チェック用（リスト走査を避ける）
+            _rejected_seen = set()   # rejected_positions用
+
             def update_progress(current, total, retry_count=0, excluded_windows=0, total_windows=0, question_range='', answer_range='', current_position='', rejected_position=''):
                 current_time = time.time()
-                generation_progress['current'] = current
-                generation_progress['total'] = total
-                generation_progress['status'] = 'generating'
-                generation_progress['retry_count'] = retry_count
-                generation_progress['excluded_windows'] = excluded_windows
-                generation_progress['total_windows'] = total_windows
-
-                # 現在試行中の位置を常に記録（リアルタイム表示用）
-                generation_progress['current_trying_position'] = current_position
-
-                # FAQ生成成功時（retry_count == 0）のみ位置をリストに追加
-                if retry_count == 0 and current_position and current_position not in generation_progress['positions_list']:
-                    generation_progress['positions_list'].append(current_position)
 
-                # 拒否された位置を記録（赤字表示用）
-                if rejected_position and rejected_position not in generation_progress['rejected_positions']:
-                    generation_progress['rejected_positions'].append(rejected_position)
+                # 200ms以内の連続呼び出しは間引く（件数と位置だけ反映して戻る）
+                # 最終ティック（current == total）は必ず全体を更新する
+                if current != total and current_time - _last_flush[0] < 0.2:
+                    with _progress_lock:
+                        generation_progress['current'] = current
+                        generation_progress['total'] = total
+                        generation_progress['current_trying_position'] = current_position
+                        if retry_count == 0 and current_position and current_position not in _positions_seen:
+                            _positions_seen.add(current_position)
+                            generation_progress['positions_list'].append(current_position)
+                        if rejected_position and rejected_position not in _rejected_seen:
+                            _rejected_seen.add(rejected_position)
+                            generation_progress['rejected_positions'].append(rejected_position)
+                        _refresh_progress_snapshot_locked()
+                    return
+                _last_flush[0] = current_time
+
+                with _progress_lock:
+                    generation_progress['current'] = current
+                    generation_progress['total'] = total
+                    generation_progress['status'] = 'generating'
+                    generation_progress['retry_count'] = retry_count
+                    generation_progress['excluded_windows'] = excluded_windows
+                    generation_progress['total_windows'] = total_windows
+
+                    # 現在試行中の位置を常に記録（リアルタイム表示用）
+                    generation_progress['current_trying_position'] = current_position
+
+                    # FAQ生成成功時（retry_count == 0）のみ位置をリストに追加
+                    if retry_count == 0 and current_position and current_position not in _positions_seen:
+                        _positions_seen.add(current_position)
+                        generation_progress['positions_list'].append(current_position)
+
+                    # 拒否された位置を記録（赤字表示用）
+                    if rejected_position and rejected_position not in _rejected_seen:
+                        _rejected_seen.add(rejected_position)
+                        generation_progress['rejected_positions'].append(rejected_position)
+
+                    generation_progress['last_update_time'] = current_time
+
+                    # 経過時間を計算
+                    if generation_progress['start_time']:
+                        generation_progress['elapsed_time'] = current_time - generation_progress['start_time']
+
+                        # 生成速度は直近ティックの瞬間速度のEWMAで追従させる
+                        # （開始からの累積平均だと後半の失速がETAに反映されにくい）
+                        if current > _last_sample[0] and current_time > _last_sample[1]:
+                            inst = (current - _last_sample[0]) / (current_time - _last_sample[1])
+                            prev = generation_progress['average_speed']
+                            speed = inst if prev <= 0 else 0.2 * inst + 0.8 * prev
+                            generation_progress['average_speed'] = speed
+                            if speed > 0:
+                                generation_progress['time_per_faq'] = 1.0 / speed
+                            _last_sample[0] = current
+                            _last_sample[1] = current_time
+
+                    _refresh_progress_snapshot_locked()
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    # %形式で遅延フォーマット。joinだけは事前評価が必要なのでisEnabledForで囲む
+                    logger.debug(
+                        "進捗更新: %d/%d, 経過時間: %.1f秒, 平均速度: %.2f FAQ/秒, ウィンドウリトライ: %d, 除外ウィンドウ: %d/%d, 位置リスト: %s, 試行中: %s",
+                        current, total,
+                        generation_progress['elapsed_time'],
+                        generation_progress['average_speed'],
+                        retry_count, excluded_windows, total_windows,
+                        ', '.join(generation_progress['positions_list']),
+                        current_position
+                    )
+                publish_progress()
 
-                generation_progress['last_update_time'] = current_time
+            faq_system.progress_callback = update_progress
 
-                # 経過時間を計算
-                if generation_progress['start_time']:
-                    generation_progress['elapsed_time'] = current_time - generation_progress['start_time']
+            # 受理されたFAQを逐次進捗に反映する（生成完了を待たずに一覧表示できる）
+            streamed_faqs = []
 
-                    # 生成速度を計算（現在の件数 / 経過時間）
-                    if current > 0 and generation_progress['elapsed_time'] > 0:
-                        generation_progress['average_speed'] = current / generation_progress['elapsed_time']
-                        generation_progress['time_per_faq'] = generation_progress['elapsed_time'] / current
+            def on_faq_accepted(faq):
+                window_info = faq.get('window_info', '')
+                match = _POSITION_RE.search(window_info) if window_info else None
+                streamed_faqs.append({
+                    'question': faq.get('question', ''),
+                    'position': match.group(1) if match else ''
+                })
+                set_progress(generated_faqs_list=list(streamed_faqs))
 
-                print(f"[DEBUG] 進捗更新: {current}/{total}, 経過時間: {generation_progress['elapsed_time']:.1f}秒, 平均速度: {generation_progress['average_speed']:.2f} FAQ/秒, ウィンドウリトライ: {retry_count}, 除外ウィンドウ: {excluded_windows}/{total_windows}, 位置リスト: {', '.join(generation_progress['positions_list'])}, 試行中: {current_position}")
-
-            faq_system.progress_callback = update_progress
+            faq_system.faq_accepted_callback = on_faq_accepted
 
             # バックグラウンドスレッドでFAQ生成を実行
             def generate_in_background():
                 log_debug("--- バックグラウンドスレッド開始 ---")
+                local_status = 'generating'
                 try:
                     log_debug("バックグラウンドスレッドでFAQ生成開始")
-                    print("[DEBUG] バックグラウンドスレッドでFAQ生成開始")
+                    logger.debug("バックグラウンドスレッドでFAQ生成開始")
                     log_debug(f"PDF path: {pdf_path}")
                     log_debug(f"PDF exists: {os.path.exists(pdf_path)}")
                     log_debug(f"Num questions: {num_questions}")
                     log_debug(f"Category: {category}")
-                    print(f"[DEBUG] PDF path: {pdf_path}")
-                    print(f"[DEBUG] PDF exists: {os.path.exists(pdf_path)}")
-                    print(f"[DEBUG] Num questions: {num_questions}")
-                    print(f"[DEBUG] Category: {category}")
+                    logger.debug(f"PDF path: {pdf_path}")
+                    logger.debug(f"PDF exists: {os.path.exists(pdf_path)}")
+                    logger.debug(f"Num questions: {num_questions}")
+                    logger.debug(f"Category: {category}")
 
                     log_debug("generate_faqs_from_document呼び出し前")
                     log_debug(f"faq_system.claude_api_key is set: {faq_system.claude_api_key is not None}")
                     if faq_system.claude_api_key:
                         log_debug(f"API key starts: {faq_system.claude_api_key[:15]}...")
 
-                    # FAQSystemにログ関数を渡す（内部でログを記録できるように）
-                    original_print = print
-                    def intercepted_print(*args, **kwargs):
-                        message = ' '.join(str(arg) for arg in args)
-                        log_debug(f"[faq_system] {message}")
-                        original_print(*args, **kwargs)
-
-                    # 一時的にprintを置き換え
-                    import builtins
-                    builtins.print = intercepted_print
-
-                    try:
-                        generated_faqs = faq_system.generate_faqs_from_document(pdf_path, num_questions, category)
-                        log_debug(f"generate_faqs_from_document呼び出し後: {len(generated_faqs)} FAQs生成")
-                        print(f"[DEBUG] FAQ generation completed, generated: {len(generated_faqs)} FAQs")
-                    finally:
-                        # printを元に戻す
-                        builtins.print = original_print
+                    generated_faqs = faq_system.generate_faqs_from_document(pdf_path, num_questions, category)
+                    log_debug(f"generate_faqs_from_document呼び出し後: {len(generated_faqs)} FAQs生成")
+                    logger.debug(f"FAQ generation completed, generated: {len(generated_faqs)} FAQs")
 
                     # 生成完了（中断された場合もFAQがあれば保存）
+                    # ステータスはローカルに持ち、finallyで1回だけ公開する
                     if faq_system.generation_interrupted:
-                        generation_progress['status'] = 'interrupted'
-                        print(f"[DEBUG] FAQ生成が中断されました（生成済み: {len(generated_faqs)}件）")
+                        local_status = 'interrupted'
+                        logger.debug(f"FAQ生成が中断されました（生成済み: {len(generated_faqs)}件）")
                     else:
-                        generation_progress['status'] = 'completed'
+                        local_status = 'completed'
 
                     if not generated_faqs:
-                        generation_progress['status'] = 'error' if not faq_system.generation_interrupted else 'interrupted'
-                        print("[DEBUG] FAQ生成失敗: 生成されたFAQがありません")
+                        if not faq_system.generation_interrupted:
+                            local_status = 'error'
+                        logger.debug("FAQ生成失敗: 生成されたFAQがありません")
                         return
 
-                    # 生成されたFAQを承認待ちキューに追加（中断されても実行）
-                    added_count = 0
+                    # 生成されたFAQを承認待ちキューにまとめて追加（中断されても実行、CSV書き込みは1回）
+                    # 質問と位置の一覧は受理コールバックが逐次反映済み
                     total_generated = len(generated_faqs)
-                    faqs_list = []  # 生成されたFAQリスト（質問と位置）
-
-                    for faq in generated_faqs:
-                        try:
-                            qa_id = faq_system.add_pending_qa(
-                                question=faq.get('question', ''),
-                                answer=faq.get('answer', ''),
-                                keywords=faq.get('keywords', ''),
-                                category=faq.get('category', category),
-                                user_question=f"[自動生成] 米国ビザ申請の手引きVer.21..pdfから生成",
-                                window_info=faq.get("window_info", "")
-                            )
-                            added_count += 1
-                            print(f"[DEBUG] 承認待ちQ&Aに追加: {qa_id}")
-
-                            # 質問と位置情報を抽出してリストに追加
-                            window_info = faq.get("window_info", "")
-                            position = ""
-                            if window_info:
-                                # window_info形式: "Q範囲: 1250~1750 / A範囲: 1000~2500 / 位置: 1000"
-                                import re
-                                match = re.search(r'位置:\s*(\d+)', window_info)
-                                if match:
-                                    position = match.group(1)
-
-                            faqs_list.append({
-                                'question': faq.get('question', ''),
-                                'position': position
-                            })
-                        except Exception as e:
-                            print(f"[DEBUG] 承認待ちQ&A追加エラー: {e}")
-
-                    # 生成されたFAQリストをgeneration_progressに保存
-                    generation_progress['generated_faqs_list'] = faqs_list
-                    print(f"[DEBUG] {added_count}件のFAQを承認待ちキューに追加しました")
+                    added_count = 0
+
+                    try:
+                        qa_ids = faq_system.add_pending_qa_bulk(
+                            generated_faqs,
+                            source="[自動生成] 米国ビザ申請の手引きVer.21..pdfから生成",
+                            default_category=category
+                        )
+                        added_count = len(qa_ids)
+                    except Exception as e:
+                        logger.debug(f"承認待ちQ&A追加エラー: {e}")
+
+                    logger.debug(f"{added_count}件のFAQを承認待ちキューに追加しました")
 
                 except Exception as e:
                     error_msg = f"バックグラウンドFAQ生成エラー: {e}"
                     log_debug(f"EXCEPTION: {error_msg}")
-                    print(f"[DEBUG] {error_msg}")
-                    import traceback
+                    logger.debug(f"{error_msg}")
                     error_trace = traceback.format_exc()
                     log_debug(f"Traceback:\n{error_trace}")
                     traceback.print_exc()
-                    generation_progress['status'] = 'error'
-
-            # スレッドを起動
-            thread = threading.Thread(target=generate_in_background)
-            thread.daemon = True
-            thread.start()
+                    local_status = 'error'
+                finally:
+                    # 最終ステータスの書き込みは1回だけ。途中の書き込みがないので
+                    # ポーラーが「completedなのに件数が古い」状態を観測しない
+                    set_progress(status=local_status)
+
+            # ジョブを起動（同時実行は1件まで）
+            if not start_generation_job(generate_in_background):
+                return jsonify({
+                    'success': False,
+                    'message': 'FAQ生成がすでに実行中です。完了を待ってから再実行してください。'
+                })
 
             # 即座にレスポンスを返す（Railway タイムアウト回避）
             return jsonify({
@@ -1198,17 +1752,10 @@ def auto_generate_faqs():
             if num_questions < 1 or num_questions > 50:
                 return jsonify({'success': False, 'message': '生成数は1-50の範囲で指定してください'})
 
-            # ファイルサイズチェック（10MB制限）
-            uploaded_file.seek(0, 2)  # ファイルの末尾に移動
-            file_size = uploaded_file.tell()
-            uploaded_file.seek(0)  # ファイルの先頭に戻す
-
-            if file_size > 10 * 1024 * 1024:  # 10MB
-                return jsonify({'success': False, 'message': 'ファイルサイズが10MBを超えています'})
+            # ファイルサイズはWerkzeugのMAX_CONTENT_LENGTHが受信時点で
+            # 弾くため、ここでのseek/tellによる全量読み込みは不要
 
             # 一時ファイルとして保存
-            import tempfile
-            import uuid
 
             temp_dir = tempfile.gettempdir()
             temp_filename = f"uploaded_pdf_{uuid.uuid4().hex[:8]}_{uploaded_file.filename}"
@@ -1216,118 +1763,179 @@ def auto_generate_faqs():
 
             # アップロードされたファイルを保存
             uploaded_file.save(pdf_path)
-            print(f"[DEBUG] FAQ自動生成開始 - ファイル: {uploaded_file.filename}, 数: {num_questions}")
+            logger.debug(f"FAQ自動生成開始 - ファイル: {uploaded_file.filename}, 数: {num_questions}")
 
             # 進捗状況を初期化
-            generation_progress['current'] = 0
-            generation_progress['total'] = num_questions
-            generation_progress['status'] = 'generating'
-            generation_progress['retry_count'] = 0
-            generation_progress['max_retries'] = 10
-            generation_progress['excluded_windows'] = 0
-            generation_progress['total_windows'] = 0
-            generation_progress['question_range'] = ''
-            generation_progress['answer_range'] = ''
+            set_progress(
+                current=0,
+                total=num_questions,
+                status='generating',
+                retry_count=0,
+                max_retries=10,
+                excluded_windows=0,
+                total_windows=0,
+                question_range='',
+                answer_range=''
+            )
 
             # 中断フラグをリセット
             faq_system.generation_interrupted = False
 
             # 進捗更新用コールバックを設定
+            _last_flush = [0.0]
+            _last_sample = [0, time.time()]  # EWMA速度計算用の前回ティック (件数, 時刻)
+            _positions_seen = set()  # positions_list重複チェック用（リスト走査を避ける）
+            _rejected_seen = set()   # rejected_positions用
+
             def update_progress(current, total, retry_count=0, excluded_windows=0, total_windows=0, question_range='', answer_range='', current_position='', rejected_position=''):
                 current_time = time.time()
-                generation_progress['current'] = current
-                generation_progress['total'] = total
-                generation_progress['status'] = 'generating'
-                generation_progress['retry_count'] = retry_count
-                generation_progress['excluded_windows'] = excluded_windows
-                generation_progress['total_windows'] = total_windows
-
-                # 現在試行中の位置を常に記録（リアルタイム表示用）
-                generation_progress['current_trying_position'] = current_position
-
-                # FAQ生成成功時（retry_count == 0）のみ位置をリストに追加
-                if retry_count == 0 and current_position and current_position not in generation_progress['positions_list']:
-                    generation_progress['positions_list'].append(current_position)
 
-                # 拒否された位置を記録（赤字表示用）
-                if rejected_position and rejected_position not in generation_progress['rejected_positions']:
-                    generation_progress['rejected_positions'].append(rejected_position)
+                # 200ms以内の連続呼び出しは間引く（件数と位置だけ反映して戻る）
+                # 最終ティック（current == total）は必ず全体を更新する
+                if current != total and current_time - _last_flush[0] < 0.2:
+                    with _progress_lock:
+                        generation_progress['current'] = current
+                        generation_progress['total'] = total
+                        generation_progress['current_trying_position'] = current_position
+                        if retry_count == 0 and current_position and current_position not in _positions_seen:
+                            _positions_seen.add(current_position)
+                            generation_progress['positions_list'].append(current_position)
+                        if rejected_position and rejected_position not in _rejected_seen:
+                            _rejected_seen.add(rejected_position)
+                            generation_progress['rejected_positions'].append(rejected_position)
+                        _refresh_progress_snapshot_locked()
+                    return
+                _last_flush[0] = current_time
+
+                with _progress_lock:
+                    generation_progress['current'] = current
+                    generation_progress['total'] = total
+                    generation_progress['status'] = 'generating'
+                    generation_progress['retry_count'] = retry_count
+                    generation_progress['excluded_windows'] = excluded_windows
+                    generation_progress['total_windows'] = total_windows
+
+                    # 現在試行中の位置を常に記録（リアルタイム表示用）
+                    generation_progress['current_trying_position'] = current_position
+
+                    # FAQ生成成功時（retry_count == 0）のみ位置をリストに追加
+                    if retry_count == 0 and current_position and current_position not in _positions_seen:
+                        _positions_seen.add(current_position)
+                        generation_progress['positions_list'].append(current_position)
+
+                    # 拒否された位置を記録（赤字表示用）
+                    if rejected_position and rejected_position not in _rejected_seen:
+                        _rejected_seen.add(rejected_position)
+                        generation_progress['rejected_positions'].append(rejected_position)
+
+                    generation_progress['last_update_time'] = current_time
+
+                    # 経過時間を計算
+                    if generation_progress['start_time']:
+                        generation_progress['elapsed_time'] = current_time - generation_progress['start_time']
+
+                        # 生成速度は直近ティックの瞬間速度のEWMAで追従させる
+                        # （開始からの累積平均だと後半の失速がETAに反映されにくい）
+                        if current > _last_sample[0] and current_time > _last_sample[1]:
+                            inst = (current - _last_sample[0]) / (current_time - _last_sample[1])
+                            prev = generation_progress['average_speed']
+                            speed = inst if prev <= 0 else 0.2 * inst + 0.8 * prev
+                            generation_progress['average_speed'] = speed
+                            if speed > 0:
+                                generation_progress['time_per_faq'] = 1.0 / speed
+                            _last_sample[0] = current
+                            _last_sample[1] = current_time
+
+                    _refresh_progress_snapshot_locked()
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    # %形式で遅延フォーマット。joinだけは事前評価が必要なのでisEnabledForで囲む
+                    logger.debug(
+                        "進捗更新: %d/%d, 経過時間: %.1f秒, 平均速度: %.2f FAQ/秒, ウィンドウリトライ: %d, 除外ウィンドウ: %d/%d, 位置リスト: %s, 試行中: %s",
+                        current, total,
+                        generation_progress['elapsed_time'],
+                        generation_progress['average_speed'],
+                        retry_count, excluded_windows, total_windows,
+                        ', '.join(generation_progress['positions_list']),
+                        current_position
+                    )
+                publish_progress()
 
-                generation_progress['last_update_time'] = current_time
-
-                # 経過時間を計算
-                if generation_progress['start_time']:
-                    generation_progress['elapsed_time'] = current_time - generation_progress['start_time']
+            faq_system.progress_callback = update_progress
 
-                    # 生成速度を計算（現在の件数 / 経過時間）
-                    if current > 0 and generation_progress['elapsed_time'] > 0:
-                        generation_progress['average_speed'] = current / generation_progress['elapsed_time']
-                        generation_progress['time_per_faq'] = generation_progress['elapsed_time'] / current
+            # 受理されたFAQを逐次進捗に反映する（生成完了を待たずに一覧表示できる）
+            streamed_faqs = []
 
-                print(f"[DEBUG] 進捗更新: {current}/{total}, 経過時間: {generation_progress['elapsed_time']:.1f}秒, 平均速度: {generation_progress['average_speed']:.2f} FAQ/秒, ウィンドウリトライ: {retry_count}, 除外ウィンドウ: {excluded_windows}/{total_windows}, 位置リスト: {', '.join(generation_progress['positions_list'])}, 試行中: {current_position}")
+            def on_faq_accepted(faq):
+                window_info = faq.get('window_info', '')
+                match = _POSITION_RE.search(window_info) if window_info else None
+                streamed_faqs.append({
+                    'question': faq.get('question', ''),
+                    'position': match.group(1) if match else ''
+                })
+                set_progress(generated_faqs_list=list(streamed_faqs))
 
-            faq_system.progress_callback = update_progress
+            faq_system.faq_accepted_callback = on_faq_accepted
 
             # バックグラウンドスレッドでFAQ生成を実行
             def generate_in_background():
+                local_status = 'generating'
                 try:
-                    print("[DEBUG] バックグラウンドスレッドでFAQ生成開始（通常モード）")
+                    logger.debug("バックグラウンドスレッドでFAQ生成開始（通常モード）")
                     generated_faqs = faq_system.generate_faqs_from_document(pdf_path, num_questions, category)
 
-                    # 一時ファイルをクリーンアップ
-                    try:
-                        if os.path.exists(pdf_path):
-                            os.remove(pdf_path)
-                            print(f"[DEBUG] 一時ファイル削除: {pdf_path}")
-                    except Exception as cleanup_error:
-                        print(f"[DEBUG] 一時ファイル削除エラー: {cleanup_error}")
+                    # 一時ファイルのクリーンアップは別ワーカーに任せる
+                    # （ネットワークボリュームだとremoveが遅いことがあり、完了通知を待たせない）
+                    _faq_executor.submit(_cleanup_temp_file, pdf_path)
 
                     # 生成完了（中断された場合もFAQがあれば保存）
+                    # ステータスはローカルに持ち、finallyで1回だけ公開する
                     if faq_system.generation_interrupted:
-                        generation_progress['status'] = 'interrupted'
-                        print(f"[DEBUG] FAQ生成が中断されました（生成済み: {len(generated_faqs)}件）")
+                        local_status = 'interrupted'
+                        logger.debug(f"FAQ生成が中断されました（生成済み: {len(generated_faqs)}件）")
                     else:
-                        generation_progress['status'] = 'completed'
+                        local_status = 'completed'
 
                     if not generated_faqs:
-                        generation_progress['status'] = 'error' if not faq_system.generation_interrupted else 'interrupted'
-                        print("[DEBUG] FAQ生成失敗: 生成されたFAQがありません")
+                        if not faq_system.generation_interrupted:
+                            local_status = 'error'
+                        logger.debug("FAQ生成失敗: 生成されたFAQがありません")
                         return
 
-                    # 生成されたFAQを承認待ちキューに追加（中断されても実行）
+                    # 生成されたFAQを承認待ちキューにまとめて追加（中断されても実行、CSV書き込みは1回）
                     added_count = 0
                     total_generated = len(generated_faqs)
-                    for faq in generated_faqs:
-                        try:
-                            qa_id = faq_system.add_pending_qa(
-                                question=faq.get('question', ''),
-                                answer=faq.get('answer', ''),
-                                keywords=faq.get('keywords', ''),
-                                category=faq.get('category', category),
-                                user_question=f"[自動生成] {uploaded_file.filename}から生成",
-                                window_info=faq.get("window_info", "")
-                            )
-                            added_count += 1
-                            print(f"[DEBUG] 承認待ちQ&Aに追加: {qa_id}")
-                        except Exception as e:
-                            print(f"[DEBUG] 承認待ちQ&A追加エラー: {e}")
-
-                    print(f"[DEBUG] {added_count}件のFAQを承認待ちキューに追加しました")
+                    try:
+                        qa_ids = faq_system.add_pending_qa_bulk(
+                            generated_faqs,
+                            source=f"[自動生成] {uploaded_file.filename}から生成",
+                            default_category=category
+                        )
+                        added_count = len(qa_ids)
+                    except Exception as e:
+                        logger.debug(f"承認待ちQ&A追加エラー: {e}")
+
+                    logger.debug(f"{added_count}件のFAQを承認待ちキューに追加しました")
 
                 except Exception as e:
                     error_msg = f"バックグラウンドFAQ生成エラー: {e}"
                     log_debug(f"EXCEPTION: {error_msg}")
-                    print(f"[DEBUG] {error_msg}")
-                    import traceback
+                    logger.debug(f"{error_msg}")
                     error_trace = traceback.format_exc()
                     log_debug(f"Traceback:\n{error_trace}")
                     traceback.print_exc()
-                    generation_progress['status'] = 'error'
-
-            # スレッドを起動
-            thread = threading.Thread(target=generate_in_background)
-            thread.daemon = True
-            thread.start()
+                    local_status = 'error'
+                finally:
+                    # 最終ステータスの書き込みは1回だけ。途中の書き込みがないので
+                    # ポーラーが「completedなのに件数が古い」状態を観測しない
+                    set_progress(status=local_status)
+
+            # ジョブを起動（同時実行は1件まで）
+            if not start_generation_job(generate_in_background):
+                return jsonify({
+                    'success': False,
+                    'message': 'FAQ生成がすでに実行中です。完了を待ってから再実行してください。'
+                })
 
             # 即座にレスポンスを返す（Railway タイムアウト回避）
             return jsonify({
@@ -1336,14 +1944,60 @@ def auto_generate_faqs():
             })
 
     except Exception as e:
-        print(f"[DEBUG] FAQ自動生成エラー: {e}")
-        import traceback
+        logger.debug(f"FAQ自動生成エラー: {e}")
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'エラーが発生しました: {str(e)}'})
 
+# フィードバック改善ジョブ（チケットID -> (Future, 登録時刻)）
+# ポーリングされないまま放置されたチケットはTTL超過で掃除する
+_feedback_tickets = {}
+_feedback_tickets_lock = threading.Lock()
+FEEDBACK_TICKET_TTL = int(os.getenv('FEEDBACK_TICKET_TTL', '600'))  # 秒
+
+
+def _sweep_feedback_tickets(now):
+    """TTLを過ぎたチケットを削除する（_feedback_tickets_lock保持中に呼ぶ）"""
+    expired = [t for t, (_, created) in _feedback_tickets.items()
+               if now - created > FEEDBACK_TICKET_TTL]
+    for t in expired:
+        del _feedback_tickets[t]
+
+
+def _prebuilt_json(payload, status=200):
+    """内容が固定のJSONレスポンスを起動時にシリアライズしておく"""
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return (body, status, {'Content-Type': 'application/json'})
+
+
+_RESP_FEEDBACK_OK = _prebuilt_json({'status': 'success'})
+_RESP_TICKET_UNKNOWN = _prebuilt_json({'status': 'unknown'}, status=404)
+_RESP_TICKET_PENDING = _prebuilt_json({'status': 'pending'})
+_RESP_IMPROVE_ERROR = _prebuilt_json({
+    'status': 'success',
+    'message': 'フィードバックありがとうございます。記録いたしました。（改善処理エラー）'
+})
+_RESP_IMPROVE_FAILED = _prebuilt_json({
+    'status': 'success',
+    'message': 'フィードバックありがとうございます。改善案の生成に失敗しましたが、記録いたしました。'
+})
+_RESP_IMPROVE_SUCCESS = _prebuilt_json({
+    'status': 'success',
+    'message': (
+        'フィードバックありがとうございます。'
+        f"{'【Claude API】' if _HAS_CLAUDE_API else '【モック機能】'}"
+        'が改善されたQ&Aを自動生成しました。管理者による承認後にFAQに追加されます。'
+    )
+})
+
+
 @app.route('/feedback', methods=['POST'])
 def feedback():
-    """ユーザーフィードバックを処理"""
+    """ユーザーフィードバックを処理
+
+    改善案の生成（Claude API呼び出し）はワーカープールで実行し、
+    チケットIDを返してリクエストスレッドをすぐ解放する。
+    結果は /feedback/status/<ticket> でポーリングする。
+    """
     data = request.get_json()
     satisfied = data.get('satisfied')
     user_question = data.get('user_question')
@@ -1351,74 +2005,67 @@ def feedback():
     matched_answer = data.get('matched_answer')
 
     if not satisfied and user_question:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 時刻は1回だけサンプリングし、記録と改善ジョブの両方で使い回す
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
 
         # 不満足なQ&Aを記録
         faq_system.save_unsatisfied_qa(user_question, matched_question, matched_answer, timestamp)
 
-        # Claude API が設定されているかチェック
-        import os
-        api_key = os.getenv('CLAUDE_API_KEY')
-        print(f"[DEBUG] CLAUDE_API_KEY exists: {bool(api_key)}")
-        if api_key:
-            print(f"[DEBUG] API key starts with: {api_key[:10] if len(api_key) > 10 else 'too short'}")
-
-        if api_key:
-            # Claude で自動改善を試行
-            try:
-                print(f"[DEBUG] Claude API で自動改善開始: {user_question}")
-                improvement_success = faq_system.auto_improve_qa(user_question, matched_question, matched_answer)
-                if improvement_success:
-                    print(f"[DEBUG] 自動改善成功")
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'フィードバックありがとうございます。【Claude API】が改善されたQ&Aを自動生成しました。管理者による承認後にFAQに追加されます。'
-                    })
-                else:
-                    print(f"[DEBUG] 自動改善失敗")
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'フィードバックありがとうございます。改善案の生成に失敗しましたが、記録いたしました。'
-                    })
-            except Exception as e:
-                print(f"自動改善エラー: {e}")
-                return jsonify({
-                    'status': 'success',
-                    'message': 'フィードバックありがとうございます。記録いたしました。（Claude API エラー）'
-                })
-        else:
-            # Claude API キー未設定の場合、モック機能を使用
-            print(f"[DEBUG] Claude API キー未設定。モック改善機能を使用します")
-            try:
-                improvement_success = faq_system.auto_improve_qa(user_question, matched_question, matched_answer)
-                if improvement_success:
-                    print(f"[DEBUG] モック改善成功")
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'フィードバックありがとうございます。【モック機能】が改善されたQ&Aを自動生成しました。管理者による承認後にFAQに追加されます。'
-                    })
-                else:
-                    print(f"[DEBUG] モック改善失敗")
-                    return jsonify({
-                        'status': 'success',
-                        'message': 'フィードバックありがとうございます。改善案の生成に失敗しましたが、記録いたしました。'
-                    })
-            except Exception as e:
-                print(f"モック改善エラー: {e}")
-                return jsonify({
-                    'status': 'success',
-                    'message': 'フィードバックありがとうございます。記録いたしました。（モック機能エラー）'
-                })
+        # 改善処理をバックグラウンドに投入（Claude APIの待ち時間でワーカーを塞がない）
+        logger.debug(f"自動改善をバックグラウンドで開始: {user_question}")
+        future = _faq_executor.submit(improve_qa_cached, user_question, matched_question, matched_answer, timestamp)
+        ticket = str(uuid.uuid4())
+        now = time.time()
+        with _feedback_tickets_lock:
+            _sweep_feedback_tickets(now)
+            _feedback_tickets[ticket] = (future, now)
+
+        return jsonify({
+            'status': 'pending',
+            'ticket': ticket,
+            'message': 'フィードバックありがとうございます。改善案を生成しています。'
+        }), 202
 
-    return jsonify({'status': 'success'})
+    return _RESP_FEEDBACK_OK
+
+
+@app.route('/feedback/status/<ticket>')
+def feedback_status(ticket):
+    """フィードバック改善ジョブの状態を返す"""
+    with _feedback_tickets_lock:
+        entry = _feedback_tickets.get(ticket)
+
+    if entry is None:
+        return _RESP_TICKET_UNKNOWN
+
+    future = entry[0]
+
+    if not future.done():
+        return _RESP_TICKET_PENDING
+
+    with _feedback_tickets_lock:
+        _feedback_tickets.pop(ticket, None)
+
+    try:
+        improvement_success = future.result()
+    except Exception as e:
+        logger.error(f"自動改善エラー: {e}")
+        return _RESP_IMPROVE_ERROR
+
+    if improvement_success:
+        logger.debug("自動改善成功")
+        return _RESP_IMPROVE_SUCCESS
+    logger.debug("自動改善失敗")
+    return _RESP_IMPROVE_FAILED
 
 if __name__ == '__main__':
-    import os
+    _ensure_log_listener()
+
     # 起動時に環境変数をチェック
-    api_key = os.getenv('CLAUDE_API_KEY')
-    print(f"[STARTUP] CLAUDE_API_KEY is {'set' if api_key else 'NOT set'}")
-    if api_key:
-        print(f"[STARTUP] API key starts with: {api_key[:10]}...")
+    logger.info(f"CLAUDE_API_KEY is {'set' if _HAS_CLAUDE_API else 'NOT set'}")
+    if _HAS_CLAUDE_API:
+        logger.info(f"API key starts with: {_CLAUDE_API_KEY[:10]}...")
 
     port = int(os.environ.get('PORT', 5000))
-    app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
+    # threaded=True: /searchがClaude API待ちの間も他のリクエストを処理できるようにする
+    app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file